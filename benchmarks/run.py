@@ -0,0 +1,140 @@
+import argparse
+import json
+import platform
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+import numpy as np
+from canteen.arrivals import DEFAULT_PROFILE, ArrivalProfile
+from canteen.batch import ENGINES, engine_class
+from canteen.collector import STATES
+from canteen.layout import tiled_layout
+from canteen.profiling import Profiler
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+# Arrival intensities of one tile of the canteen, in customers per hour; bigger floors
+# get as many times the arrivals as they have tiles
+LOADS = {"off-peak": ArrivalProfile({7: 60, 16: 0}),
+         "lunch": ArrivalProfile(DEFAULT_PROFILE),
+         "2x-peak": ArrivalProfile(DEFAULT_PROFILE).scaled(2),
+         "5x-peak": ArrivalProfile(DEFAULT_PROFILE).scaled(5)}
+
+# Floor sizes as columns x rows of the default 44 x 24 canteen
+LAYOUTS = {"1x1": (1, 1), "2x1": (2, 1), "2x2": (2, 2)}
+
+METRICS = ("setup_s", "ticks_per_s", "agent_updates_per_s", "collect_s", "peak_rss_mb")
+
+
+def stepped_agents(model):
+    # Customers inside who are not parked after the step, counted alike for every engine:
+    # all but those being served, eating or waiting at the door, whom the Mesa scheduler
+    # parks and the array engines only count down
+    counts = [model.count_customers_by_state(state) for state in STATES]
+    return (sum(counts) - counts[STATES.index("eating")] - model.door_length() - model.serving_count())
+
+
+def run_case(engine, load, layout, seed):
+    # One full day in a fresh worker process, so peak RSS belongs to this case alone
+    started = perf_counter()
+    columns, rows = LAYOUTS[layout]
+    model = engine_class(engine)(seed=seed, arrival_profile=LOADS[load].scaled(columns * rows),
+                                 layout=tiled_layout(columns, rows))
+    setup = perf_counter() - started
+    profiler = Profiler()
+    profiler.time(model.datacollector, "collect")
+
+    ticks, agent_updates, elapsed = 0, 0, 0.0
+    while model.running:
+        started = perf_counter()
+        model.step()
+        elapsed += perf_counter() - started
+        ticks += 1
+        agent_updates += stepped_agents(model)
+    return {"setup_s": setup,
+            "ticks_per_s": ticks / elapsed,
+            "agent_updates_per_s": agent_updates / elapsed,
+            "collect_s": profiler.seconds["collect"],
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run_benchmarks(engines, loads, layouts, seeds):
+    results = {}
+    for engine in engines:
+        for load in loads:
+            for layout in layouts:
+                runs = []
+                for seed in seeds:
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        runs.append(pool.submit(run_case, engine, load, layout, seed).result())
+                # Median over the seeds, so one noisy run does not decide a regression
+                case = {name: float(np.median([run[name] for run in runs])) for name in METRICS}
+                results[f"{engine}/{load}/{layout}"] = case
+                print(format_case(f"{engine}/{load}/{layout}", case), flush=True)
+    return results
+
+
+def format_case(name, case, baseline=None):
+    line = (f"{name:<28}{case['ticks_per_s']:>10.0f} ticks/s{case['agent_updates_per_s']:>12.0f} updates/s"
+            f"{case['collect_s']:>8.3f}s collect{case['peak_rss_mb']:>8.0f} MB{case['setup_s']:>8.2f}s setup")
+    if baseline is not None:
+        line += f"{case['ticks_per_s'] / baseline['ticks_per_s'] - 1:>+9.1%}"
+    return line
+
+
+def compare(results, baseline, threshold):
+    # A case regresses when its tick rate falls more than `threshold` below the baseline
+    regressions = []
+    for name, case in results.items():
+        if name not in baseline["cases"]:
+            continue
+        reference = baseline["cases"][name]
+        print(format_case(name, case, reference))
+        if case["ticks_per_s"] < reference["ticks_per_s"] * (1 - threshold):
+            regressions.append(name)
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Benchmark headless canteen days against a stored baseline.")
+    parser.add_argument("--engine", nargs="+", choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument("--load", nargs="+", choices=list(LOADS), default=list(LOADS))
+    parser.add_argument("--layout", nargs="+", choices=list(LAYOUTS), default=list(LAYOUTS))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--baseline", default=str(BASELINE), help="baseline file (default: benchmarks/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed drop in ticks/s before a case counts as a regression (default: 0.15)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("-o", "--output", help="also write the results to this JSON file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = run_benchmarks(args.engine, args.load, args.layout, args.seeds)
+    report = {"machine": platform.platform(), "python": platform.python_version(), "seeds": args.seeds,
+              "cases": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.save_baseline:
+        baseline = json.loads(Path(args.baseline).read_text()) if Path(args.baseline).exists() else {"cases": {}}
+        report["cases"] = {**baseline["cases"], **results}
+        Path(args.baseline).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not Path(args.baseline).exists():
+        print(f"no baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+
+    print(f"against {args.baseline}:")
+    regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+    for name in regressions:
+        print(f"  regression: {name} is more than {args.threshold:.0%} slower than the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
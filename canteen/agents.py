@@ -1,28 +1,62 @@
 from mesa import Agent
-import random
 
 class Customer(Agent):
+    # Slots for the customer's own fields; Mesa's Agent base still keeps a small __dict__
+    __slots__ = ("_state", "service_time", "counter", "waiting", "seat", "planned_service_time", "dwell_time",
+                 "arrived_at", "queued_at", "served_at", "seated_at", "left_at")
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
+        self._state = None
+        self.reset()
+
+    def reuse(self, unique_id):
+        # A pooled customer comes back as a new arrival, see canteen.multiday
+        self.unique_id = unique_id
+        self._state = None
+        self.model.register_agent(self)
+        self.reset()
+
+    def reset(self):
+        self.service_time = 0
+        self.counter = None
+        self.waiting = False
+        self.seat = None
+        self.planned_service_time = None  # drawn on arrival under common random numbers
+        self.dwell_time = None
+        # Lifecycle timestamps (ticks), stamped by the model's LifecycleKPIs
+        self.arrived_at = None
+        self.queued_at = None
+        self.served_at = None
+        self.seated_at = None
+        self.left_at = None
         self.state = "entering"  # entering, queuing, ordering, eating, exiting
-        self.steps_eating = 0
-        self.steps_queuing = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, new_state):
+        # Every transition goes through the model, which keeps the per-state counters
+        if new_state != self._state:
+            self.model.transition(self, self._state, new_state)
+            self._state = new_state
 
     def move_towards(self, destination):
-        current_pos = self.pos
-        direction_vector = (destination[0] - current_pos[0], destination[1] - current_pos[1])
-        step_direction = (int(direction_vector[0] / max(1, abs(direction_vector[0]))), int(direction_vector[1] / max(1, abs(direction_vector[1]))))
-        new_position = (current_pos[0] + step_direction[0], current_pos[1] + step_direction[1])
-        if not self.model.grid.out_of_bounds(new_position) and new_position not in self.model.boundaries and new_position not in self.model.big_table and new_position not in self.model.store:
-            if self.state != "eating" or self.state != "entering" or self.model.grid.is_cell_empty(new_position):
-                self.model.grid.move_agent(self, new_position)
-    
+        # Follow the layout's precomputed flow field, so customers route around tables
+        new_position = self.model.layout.routes.step_towards(self.pos, destination)
+        if new_position != self.pos:
+            self.model.grid.move_agent(self, new_position)
+
     def move(self):
         possible_steps = self.model.grid.get_neighborhood(self.pos, moore=True, include_center=False)
-        free_steps = [step for step in possible_steps if self.model.grid.is_cell_empty(step)]
+        free_steps = [step for step in possible_steps if self.model.layout.is_floor(step) and self.model.grid.is_cell_empty(step)]
         if free_steps:
-            new_position = self.random.choice(free_steps)
+            new_position = self.model.streams.routing.choice(free_steps)
             self.model.grid.move_agent(self, new_position)
+        elif self.model.congestion is not None:
+            self.model.congestion.block(self.pos)  # hemmed in
 
     def step(self):
         if self.state == "entering":
@@ -39,54 +73,61 @@ class Customer(Agent):
     def enter_canteen(self):
         current_hour = int(self.model.current_time)
         if current_hour > 16 or current_hour < 8:
+            self.model.queues.turn_away(self)
             self.state = "exiting"
         elif 8 <= current_hour <= 16:
-            empty_queue = self.model.find_empty_queue(self.pos)
-            if empty_queue:
-                self.move_towards(empty_queue)
-                if self.pos == empty_queue:
-                    self.state = "ordering"
+            if self.counter is None and not self.waiting:
+                # Join a cashier queue, or wait at the door until a slot frees up
+                self.waiting = self.model.queues.join(self) is None
+            if self.counter is not None:
+                self.waiting = False
+                self.state = "queuing"
+                self.queue_for_food()
             else:
-                self.move()
+                self.model.schedule.park(self)  # woken up by the queue that hands it a slot
 
     def queue_for_food(self):
-        empty_queue = self.model.find_empty_queue(self.pos)
-        if empty_queue:
-            self.move_towards(empty_queue)
-            if self.pos == empty_queue:
-                self.state = "ordering"
-        else:
-            self.move()  # If no empty queue is found, move randomly
+        slot = self.model.queues.slot_of(self)
+        self.move_towards(slot)
+        if self.pos != slot:
+            return
+        self.model.queues.arrive(self, self.model.schedule.steps)
+        if self.model.queues.is_head(self):
+            # The queue draws the service time once, when service starts, and the
+            # customer sleeps until it is over
+            self.service_time = self.model.queues.start_service(self, self.model.schedule.steps)
+            self.state = "ordering"
+            self.model.schedule.park(self, self.service_time)
 
     def order_food(self):
-        self.steps_queuing += 1
-        if self.steps_queuing >= random.gauss(2, 1):
-            self.steps_queuing = 0
-            empty_seat = self.model.find_empty_seat(self.pos)
-            if empty_seat:
-                self.move_towards(empty_seat)
-                if self.pos == empty_seat:
-                    self.state = "eating"
-            else:
+        if self.counter is not None:
+            self.model.queues.leave(self)  # woken up once service is over
+            return
+        if self.seat is None:
+            # Claim a seat once, so the customer keeps walking to the same one
+            self.seat = self.model.find_empty_seat(self.pos)
+            if self.seat is None:
                 self.move()  # If no empty seat is found, move randomly
+                return
+            self.model.seats.occupy(self.seat)
+        self.move_towards(self.seat)
+        if self.pos == self.seat:
+            self.state = "eating"
+            # Eating takes the dwell time drawn once here; the customer wakes up the tick after
+            if self.dwell_time is None:
+                self.dwell_time = self.model.draw_dwell_time()
+            self.model.schedule.park(self, self.dwell_time + 1)
 
     def eat_food(self):
-        if self.steps_eating < random.randint(20, 30):  # Simulate eating for 20 to 30 steps (minutes)
-            self.steps_eating += 1
-        else:
-            self.state = "exiting"
+        # Only reached when the customer wakes up after eating
+        self.model.seats.release(self.seat)
+        self.seat = None
+        self.state = "exiting"
 
     def exit_canteen(self):
-        self.move_towards(self.model.exit_location[random.randint(0, len(self.model.exit_location) - 1)])
-        if self.pos in self.model.exit_location:
-            self.model.grid.remove_agent(self)
-            self.model.schedule.remove(self)
-
-
-class StaticElement(Agent):
-    def __init__(self, unique_id, model, element_type):
-        super().__init__(unique_id, model)
-        self.element_type = element_type
+        new_position = self.model.layout.routes.step_to_exit(self.pos)
+        if new_position != self.pos:
+            self.model.grid.move_agent(self, new_position)
+        if self.model.layout.is_exit(self.pos):
+            self.model.remove_customer(self)
 
-    def step(self):
-        pass
\ No newline at end of file
@@ -0,0 +1,63 @@
+import csv
+import math
+import numpy as np
+
+# Customers per hour, keyed by the hour of day the rate starts at. Rates hold until the
+# next listed hour; hours before the first entry have no arrivals.
+DEFAULT_PROFILE = {7: 60, 11: 120, 13: 60, 16: 0}
+
+
+class ArrivalProfile:
+    # Piecewise-constant arrival rate over the day, for a non-homogeneous Poisson process
+    def __init__(self, hourly_rates):
+        hours = sorted(hourly_rates)
+        self.hours = np.array(hours, dtype=np.float64)
+        self.rates = np.array([hourly_rates[h] for h in hours], dtype=np.float64)
+        if (self.rates < 0).any():
+            raise ValueError("Arrival rates must not be negative")
+
+    @classmethod
+    def from_csv(cls, path):
+        # Two columns, hour and customers per hour, e.g. measured turnstile counts
+        with open(path, newline="") as f:
+            rows = [row for row in csv.reader(f) if row and not row[0].startswith("#")]
+        if rows and not rows[0][0].replace(".", "", 1).isdigit():
+            rows = rows[1:]  # header
+        return cls({float(hour): float(rate) for hour, rate in rows})
+
+    def scaled(self, factor):
+        return ArrivalProfile(dict(zip(self.hours.tolist(), (self.rates * factor).tolist())))
+
+    def rate(self, times):
+        index = np.searchsorted(self.hours, times, side="right") - 1
+        return np.where(index >= 0, self.rates[np.maximum(index, 0)], 0.0)
+
+    def generate(self, rng, start, end):
+        # Thinning: draw a homogeneous process at the peak rate, keep each point with
+        # probability rate(t) / peak, all in one vectorized pass
+        peak = self.rates.max(initial=0.0)
+        if peak <= 0 or end <= start:
+            return np.empty(0)
+        candidates = rng.uniform(start, end, rng.poisson(peak * (end - start)))
+        keep = rng.random(len(candidates)) * peak < self.rate(candidates)
+        return np.sort(candidates[keep])
+
+
+def arrival_hours(model, start=None, end=None):
+    # Indices of the model's hours (0 is the first hour of the day) from start to end o'clock
+    if start is None and end is None:
+        return None
+    start = model.start_time if start is None else start
+    end = model.end_time if end is None else end
+    return range(int(start - model.start_time), int(math.ceil(end - model.start_time)))
+
+
+def arrival_times_for(profile, times, rng, start, end):
+    # Explicit timestamps (hours) are replayed as given; otherwise the profile is sampled
+    if times is not None:
+        return np.sort(np.asarray(times, dtype=np.float64))
+    if profile is None:
+        profile = ArrivalProfile(DEFAULT_PROFILE)
+    elif not isinstance(profile, ArrivalProfile):
+        profile = ArrivalProfile(profile)
+    return profile.generate(rng, start, end)
@@ -0,0 +1,159 @@
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .cache import ResultsCache, scenario_key
+from .collector import column_array
+from .profiling import merge_profiles
+
+# Engines are imported on first use: importing Mesa also loads its visualization stack
+# (tornado, networkx), which headless workers running the vectorized engine never need
+ENGINES = {"mesa": "canteen.model:CanteenModel", "vectorized": "canteen.vectorized:VectorizedCanteenModel",
+           "parallel": "canteen.parallel:ParallelCanteenModel"}
+
+
+def engine_class(engine):
+    module, name = ENGINES[engine].split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def run_model(seed, engine="mesa", width=None, height=None, **model_params):
+    # One headless day; returns the model reporter frame tagged with the seed
+    if model_params.get("record_to") is not None:
+        model_params["record_to"] = Path(model_params["record_to"]) / f"seed-{seed}"  # one recording per run
+    model = engine_class(engine)(width, height, seed=seed, **model_params)
+    while model.running:
+        model.step()
+    frame = model.datacollector.get_model_vars_dataframe()
+    frame.insert(0, "Step", np.arange(len(frame)))
+    frame.insert(0, "Seed", seed)
+    frame.attrs["kpis"] = model_kpis(model)
+    if model.profiler is not None:
+        frame.attrs["profile"] = model.profiler.to_dict()
+    return frame
+
+
+def model_kpis(model):
+    # End-of-day figures kept with each run's reporters, and in the results cache
+    return {"Mean Queue Wait": float(model.mean_wait()),
+            "P95 Queue Wait": int(model.wait_percentile(95)),
+            **model.lifecycle.summary()}
+
+
+def open_cache(cache):
+    # cache=True uses the default location, a path a cache there, a ResultsCache itself
+    if cache is None or cache is False:
+        return None
+    if isinstance(cache, ResultsCache):
+        return cache
+    return ResultsCache() if cache is True else ResultsCache(cache)
+
+
+def replication_seeds(replications, seed=0):
+    return [seed + i for i in range(replications)]
+
+
+def run_replications(replications, seed=0, processes=None, engine="mesa", output=None, cache=None,
+                     **model_params):
+    # With a results cache, runs already computed for the same scenario, seed and code are
+    # read back before anything is dispatched, and new runs are stored
+    seeds = replication_seeds(replications, seed)
+    cache = open_cache(cache)
+    keys = [scenario_key(engine, s, **model_params) if cache else None for s in seeds]
+    if not any(keys):
+        cache = None  # runs that always simulate, e.g. profiled ones, are neither looked up nor counted
+    frames = [cache.get(key) if cache else None for key in keys]
+    missing = [i for i, frame in enumerate(frames) if frame is None]
+    if processes == 1 or len(missing) <= 1:
+        computed = [run_model(seeds[i], engine, **model_params) for i in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(run_model, seeds[i], engine, **model_params) for i in missing]
+            computed = [future.result() for future in futures]
+    for i, frame in zip(missing, computed):
+        frames[i] = frame
+        if cache:
+            cache.put(keys[i], frame)
+    for run, frame in enumerate(frames):
+        frame.insert(0, "Run", run)
+    profiles = [frame.attrs.pop("profile") for frame in frames if "profile" in frame.attrs]
+    kpis = [{"Run": run, "Seed": s, **frame.attrs.pop("kpis", {})} for run, (s, frame) in
+            enumerate(zip(seeds, frames))]
+    results = pd.concat(frames, ignore_index=True)
+    results.attrs["kpis"] = kpis  # one dict per run; pd.DataFrame(results.attrs["kpis"]) tabulates them
+    if profiles:
+        results.attrs["profile"] = merge_profiles(profiles)
+    if cache:
+        results.attrs["cache_hits"] = len(seeds) - len(missing)
+    if output is not None:
+        write_results(results, output)
+    return results
+
+
+def compare_scenarios(scenarios, replications, seed=0, processes=None, engine="mesa", output=None,
+                      common_random_numbers=True, **model_params):
+    # Runs every scenario on the same seeds; with common random numbers, replication i of each
+    # scenario sees the same arrivals, service and dwell times, so paired differences are tight
+    frames = []
+    for name, params in scenarios.items():
+        frame = run_replications(replications, seed=seed, processes=processes, engine=engine,
+                                 common_random_numbers=common_random_numbers, **{**model_params, **params})
+        frame.insert(0, "Scenario", name)
+        frames.append(frame)
+    results = pd.concat(frames, ignore_index=True)
+    if output is not None:
+        write_results(results, output)
+    return results
+
+
+def run_variant(snapshot, variant):
+    # Continues one copy of a snapshot to the end of the day under the variant's overrides
+    from .snapshot import restore_snapshot  # Mesa engine only, see ENGINES
+    model = restore_snapshot(snapshot, **variant)
+    while model.running:
+        model.step()
+    frame = model.datacollector.get_model_vars_dataframe()
+    frame.insert(0, "Step", snapshot["steps"] + np.arange(len(frame)))
+    return frame
+
+
+def fork_variants(snapshot, variants, processes=None, output=None):
+    # Warm start: every variant (seed, queue_policy, queue_capacity, arrival_profile, ...)
+    # continues from the same snapshot instead of re-simulating the morning
+    if processes == 1:
+        frames = [run_variant(snapshot, params) for params in variants.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(run_variant, snapshot, params) for params in variants.values()]
+            frames = [future.result() for future in futures]
+    for name, frame in zip(variants, frames):
+        frame.insert(0, "Variant", name)
+    results = pd.concat(frames, ignore_index=True)
+    if output is not None:
+        write_results(results, output)
+    return results
+
+
+def write_results(frame, path):
+    path = Path(path)
+    if path.suffix == ".parquet":
+        frame.to_parquet(path, index=False)  # needs pyarrow or fastparquet
+    elif path.suffix == ".npz":
+        np.savez_compressed(path, **{name: column_array(frame[name]) for name in frame.columns})
+    elif path.suffix == ".csv":
+        frame.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported results format: {path.suffix} (use .parquet, .npz or .csv)")
+
+
+def read_results(path):
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    if path.suffix == ".npz":
+        with np.load(path) as data:
+            return pd.DataFrame({name: data[name] for name in data.files})
+    if path.suffix == ".csv":
+        return pd.read_csv(path)
+    raise ValueError(f"Unsupported results format: {path.suffix} (use .parquet, .npz or .csv)")
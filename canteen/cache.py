@@ -0,0 +1,142 @@
+import functools
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .arrivals import DEFAULT_PROFILE, ArrivalProfile
+from .collector import column_array
+from .layout import cache_root, resolve_layout
+
+# Parameters that do not change what a run computes
+IGNORED_PARAMS = ("verbose", "chunk_ticks", "congestion")
+# Runs with these set have side effects or timings, so they always simulate
+UNCACHEABLE_PARAMS = ("collect_to", "record_to", "profile")
+KPI_PREFIX = "kpi:"  # KPIs are stored next to the reporter columns under this prefix
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    # Hash of the package's sources, so any change to the model invalidates old results
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def scenario_key(engine, seed, width=None, height=None, **model_params):
+    # Content address of one fully specified, seeded run, or None when it cannot be cached
+    if seed is None or any(model_params.get(name) for name in UNCACHEABLE_PARAMS):
+        return None
+    layout = resolve_layout(model_params.pop("layout", None), width, height)
+    profile = model_params.pop("arrival_profile", None)
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if not isinstance(profile, ArrivalProfile):
+        profile = ArrivalProfile(profile)
+    times = model_params.pop("arrival_times", None)
+    spec = {"code": code_version(),
+            "engine": engine,
+            "seed": int(seed),
+            "layout": hashlib.sha256(np.ascontiguousarray(layout.cells).tobytes() +
+                                     json.dumps(layout.entrances).encode()).hexdigest(),
+            "arrivals": (hashlib.sha256(np.asarray(times, dtype=np.float64).tobytes()).hexdigest()
+                         if times is not None else [profile.hours.tolist(), profile.rates.tolist()]),
+            "params": {name: value for name, value in sorted(model_params.items())
+                       if name not in IGNORED_PARAMS + UNCACHEABLE_PARAMS}}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResultsCache:
+    # Content-addressed store of finished runs: the model reporter frame and its KPIs, one
+    # .npz file per scenario key. Reading an entry marks it as recently used; once the
+    # files add up to more than `max_bytes` (or `max_entries`), the least recently used
+    # ones are evicted. The directory is scanned once, on the first write; after that the
+    # entries' sizes and order of use are kept in memory, so a write costs the same
+    # however many entries there are.
+    def __init__(self, directory=None, max_bytes=1 << 30, max_entries=None):
+        self.directory = Path(directory) if directory is not None else cache_root() / "results"
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.index = None  # path -> size, least recently used first
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return self.directory / key[:2] / f"{key}.npz"
+
+    def get(self, key):
+        # The cached frame with its KPIs in frame.attrs["kpis"], or None
+        if key is None:
+            return None
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                frame = pd.DataFrame({name: data[name] for name in data.files if not name.startswith(KPI_PREFIX)})
+                kpis = {name[len(KPI_PREFIX):]: data[name].item() for name in data.files
+                        if name.startswith(KPI_PREFIX)}
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)  # access time for LRU eviction, which noatime mounts would not keep
+        if self.index is not None and path in self.index:
+            self.index.move_to_end(path)
+        frame.attrs["kpis"] = kpis
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        if key is None:
+            return
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        index = self.indexed()
+        columns = {name: column_array(frame[name]) for name in frame.columns}
+        columns.update({KPI_PREFIX + name: np.asarray(value) for name, value in frame.attrs.get("kpis", {}).items()})
+        # Written next to the entry and renamed, so readers never see half a file
+        fd, partial = tempfile.mkstemp(dir=path.parent, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **columns)
+        os.replace(partial, path)
+        size = path.stat().st_size
+        self.total += size - index.pop(path, 0)
+        index[path] = size
+        self.evict()
+
+    def indexed(self):
+        if self.index is None:
+            self.index = OrderedDict((path, size) for _, size, path in self.entries())
+            self.total = sum(self.index.values())
+        return self.index
+
+    def entries(self):
+        # (last use, size, path) of every entry, least recently used first
+        entries = []
+        for path in self.directory.glob("*/*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        index = self.indexed()
+        while index and (self.total > self.max_bytes or
+                         (self.max_entries is not None and len(index) > self.max_entries)):
+            path, size = index.popitem(last=False)
+            path.unlink(missing_ok=True)
+            self.total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            path.unlink(missing_ok=True)
+        self.index = None
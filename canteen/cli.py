@@ -0,0 +1,72 @@
+import argparse
+import time
+import pandas as pd
+from .arrivals import DEFAULT_PROFILE, ArrivalProfile
+from .batch import ENGINES, run_replications
+from .profiling import format_profile, write_profile
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m canteen", description="Run headless SGLC canteen replications.")
+    parser.add_argument("-n", "--replications", type=int, default=1, help="number of simulated days (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run; run i uses seed + i (default: 0)")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="mesa", help="simulation engine (default: mesa)")
+    parser.add_argument("--workers", type=int,
+                        help="strips of the floor stepped in parallel by the parallel engine (default: 4)")
+    parser.add_argument("-o", "--output", help="merged results file (.parquet, .npz or .csv)")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record every customer's position and state per tick, one DIR/seed-N per run, "
+                             "for python run.py --replay DIR/seed-N")
+    parser.add_argument("--layout", help="ASCII (.txt) or JSON floor plan (default: canteen/layouts/sglc.txt)")
+    parser.add_argument("--queue-capacity", type=int, default=5)
+    parser.add_argument("--queue-policy", choices=["shortest", "random"], default="shortest")
+    parser.add_argument("--crn", action="store_true",
+                        help="common random numbers: draw service and dwell times per customer on arrival")
+    parser.add_argument("--arrivals", help="CSV of hour,customers-per-hour rates, e.g. measured turnstile counts")
+    parser.add_argument("--arrival-scale", type=float, default=1.0, help="multiply every arrival rate (default: 1)")
+    parser.add_argument("--cache", nargs="?", const=True, metavar="DIR",
+                        help="reuse runs already computed for the same scenario and seed "
+                             "(default location: ~/.cache/canteen/results)")
+    parser.add_argument("--profile", action="store_true", help="time each phase of a tick and count search calls")
+    parser.add_argument("--profile-output", help="write the profile to a .json or .csv file (implies --profile)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers and args.engine != "parallel":
+        parser.error("--workers needs --engine parallel")
+    model_params = {"workers": args.workers} if args.workers else {}
+    if args.record:
+        model_params["record_to"] = args.record
+    profile = ArrivalProfile.from_csv(args.arrivals) if args.arrivals else ArrivalProfile(DEFAULT_PROFILE)
+    profiling = args.profile or bool(args.profile_output)
+    started = time.perf_counter()
+    results = run_replications(args.replications, seed=args.seed, processes=args.processes, engine=args.engine,
+                               output=args.output, layout=args.layout,
+                               queue_capacity=args.queue_capacity, queue_policy=args.queue_policy,
+                               common_random_numbers=args.crn, arrival_profile=profile.scaled(args.arrival_scale),
+                               profile=profiling, cache=None if profiling else args.cache,
+                               **model_params)
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.replications} run(s) with the {args.engine} engine in {elapsed:.2f}s")
+    if "cache_hits" in results.attrs:
+        print(f"  {results.attrs['cache_hits']} run(s) read from the results cache")
+    peaks = results.groupby("Run")[["Queuing", "Ordering", "Eating", "Queue Length"]].max().mean()
+    for name, value in peaks.items():
+        print(f"  mean daily peak {name}: {value:.1f}")
+    kpis = pd.DataFrame(results.attrs["kpis"])
+    for name in ("P95 Time In Queue", "P95 Time To Seat", "P95 Time In System"):
+        print(f"  mean {name}: {kpis[name].mean():.1f} min")
+    if args.output:
+        print(f"  results written to {args.output}")
+    if "profile" in results.attrs:
+        print("profile:")
+        print(format_profile(results.attrs["profile"]))
+        if args.profile_output:
+            write_profile(results.attrs["profile"], args.profile_output)
+            print(f"  profile written to {args.profile_output}")
+    return 0
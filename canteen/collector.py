@@ -0,0 +1,198 @@
+import csv
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Customer states, in the order the reporters below list them; recordings and the
+# engines' state codes are indices into this tuple
+STATES = ("entering", "queuing", "ordering", "eating", "exiting")
+
+
+def time_string(current_time):
+    # "HH:MM" of a model clock kept in hours
+    total_minutes = current_time * 60
+    return f"{int(total_minutes // 60):02d}:{int(total_minutes % 60):02d}"
+
+
+# Model-level reporters shared by both engines
+MODEL_REPORTERS = {"Current Time": lambda m: m.current_time,
+                   "Formatted Time": lambda m: m.get_time_string(),
+                   "Entering": lambda m: m.count_customers_by_state("entering"),
+                   "Queuing": lambda m: m.count_customers_by_state("queuing"),
+                   "Ordering": lambda m: m.count_customers_by_state("ordering"),
+                   "Eating": lambda m: m.count_customers_by_state("eating"),
+                   "Exiting": lambda m: m.count_customers_by_state("exiting"),
+                   "Queue Length": lambda m: m.queue_length(),
+                   "Waiting For Queue": lambda m: m.door_length(),
+                   "Mean Queue Wait": lambda m: m.mean_wait()}
+
+MODEL_DTYPES = {"Current Time": np.float64, "Formatted Time": "U5", "Entering": np.int32, "Queuing": np.int32,
+                "Ordering": np.int32, "Eating": np.int32, "Exiting": np.int32, "Queue Length": np.int32,
+                "Waiting For Queue": np.int32, "Mean Queue Wait": np.float64}
+
+AGENT_DTYPE = np.dtype([("Step", np.int32), ("AgentID", np.int64), ("State", np.uint8),
+                        ("x", np.int16), ("y", np.int16)])
+
+
+def column_dtype(value):
+    if isinstance(value, (bool, np.bool_)):
+        return np.dtype(bool)
+    if isinstance(value, (int, np.integer)):
+        return np.dtype(np.int64)
+    if isinstance(value, (float, np.floating)):
+        return np.dtype(np.float64)
+    return np.dtype("U16")
+
+
+def column_array(column):
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy()
+    return column.to_numpy(dtype=str)  # fixed-width unicode, so the file loads without pickle
+
+
+class StreamingCollector:
+    # Buffers a fixed number of ticks in typed arrays and flushes each full chunk to
+    # disk, so memory stays flat however long the run is. Agent state and position are
+    # optionally sampled every `agent_every` ticks into the same chunks.
+    def __init__(self, directory, model_reporters=MODEL_REPORTERS, chunk_ticks=240, agent_every=None, fmt="npz",
+                 dtypes=MODEL_DTYPES):
+        if fmt not in ("npz", "parquet"):
+            raise ValueError(f"Unknown collector format: {fmt}")
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_reporters = model_reporters
+        self.dtypes = dtypes  # reporters without an entry get a dtype inferred from their first value
+        self.chunk_ticks = chunk_ticks
+        self.agent_every = agent_every
+        self.fmt = fmt
+
+        self.buffers = None
+        self.row = 0
+        self.steps = 0
+        self.chunks = 0
+        self.agent_samples = []
+
+    def collect(self, model):
+        values = [reporter(model) for reporter in self.model_reporters.values()]
+        if self.buffers is None:
+            self.buffers = [np.empty(self.chunk_ticks, dtype=self.dtypes.get(name) or column_dtype(value))
+                            for name, value in zip(self.model_reporters, values)]
+        for buffer, value in zip(self.buffers, values):
+            buffer[self.row] = value
+
+        if self.agent_every and self.steps % self.agent_every == 0:
+            ids, states, xs, ys = model.agent_snapshot()
+            sample = np.empty(len(ids), dtype=AGENT_DTYPE)
+            sample["Step"] = self.steps
+            sample["AgentID"], sample["State"], sample["x"], sample["y"] = ids, states, xs, ys
+            self.agent_samples.append(sample)
+
+        self.row += 1
+        self.steps += 1
+        if self.row == self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        if self.row == 0 and not self.agent_samples:
+            return
+        model_vars = {name: buffer[:self.row] for name, buffer in zip(self.model_reporters, self.buffers or [])}
+        model_vars["Step"] = np.arange(self.steps - self.row, self.steps, dtype=np.int32)
+        self.write(f"model-{self.chunks:05d}", model_vars)
+        if self.agent_every:
+            agents = np.concatenate(self.agent_samples) if self.agent_samples else np.empty(0, dtype=AGENT_DTYPE)
+            self.write(f"agents-{self.chunks:05d}", {name: agents[name] for name in AGENT_DTYPE.names})
+        self.agent_samples = []
+        self.row = 0
+        self.chunks += 1
+
+    def write(self, name, columns):
+        path = self.directory / f"{name}.{self.fmt}"
+        if self.fmt == "npz":
+            np.savez_compressed(path, **columns)
+        else:
+            pd.DataFrame(columns).to_parquet(path, index=False)  # needs pyarrow or fastparquet
+
+    def read(self, prefix):
+        frames = []
+        for path in sorted(self.directory.glob(f"{prefix}-*.{self.fmt}")):
+            if self.fmt == "npz":
+                with np.load(path) as data:
+                    frames.append(pd.DataFrame({name: data[name] for name in data.files}))
+            else:
+                frames.append(pd.read_parquet(path))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def get_model_vars_dataframe(self):
+        self.flush()
+        frame = self.read("model")
+        return frame.drop(columns="Step") if "Step" in frame else frame
+
+    def get_agent_vars_dataframe(self):
+        self.flush()
+        return self.read("agents")
+
+
+class MemoryCollector(StreamingCollector):
+    # The same chunks kept in memory instead of on disk, for runs that sample agents
+    # without streaming to `collect_to`
+    def __init__(self, model_reporters=MODEL_REPORTERS, chunk_ticks=240, agent_every=None, dtypes=MODEL_DTYPES):
+        super().__init__(None, model_reporters, chunk_ticks=chunk_ticks, agent_every=agent_every, dtypes=dtypes)
+        self.frames = {"model": [], "agents": []}
+
+    def write(self, name, columns):
+        self.frames[name.split("-")[0]].append(pd.DataFrame(columns))
+
+    def read(self, prefix):
+        frames = self.frames[prefix]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+class DailySummaryCollector:
+    # Collector for multi-day runs: keeps only the running day's peaks and appends one
+    # summary row per day to a CSV file, so memory stays flat over weeks of ticks. Ticks
+    # can also be forwarded to a StreamingCollector (`ticks`).
+    PEAKS = {"Peak Queue Length": lambda m: m.queue_length(),
+             "Peak Waiting For Queue": lambda m: m.door_length(),
+             "Peak Eating": lambda m: m.count_customers_by_state("eating")}
+
+    def __init__(self, path=None, ticks=None):
+        self.path = Path(path) if path is not None else None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.unlink(missing_ok=True)
+        self.ticks = ticks
+        self.peaks = dict.fromkeys(self.PEAKS, 0)
+        self.rows = []  # only kept when there is no file to write to
+
+    def collect(self, model):
+        for name, reporter in self.PEAKS.items():
+            value = reporter(model)
+            if value > self.peaks[name]:
+                self.peaks[name] = value
+        if self.ticks is not None:
+            self.ticks.collect(model)
+
+    def end_day(self, summary):
+        row = {**summary, **self.peaks}
+        self.peaks = dict.fromkeys(self.PEAKS, 0)
+        if self.path is None:
+            self.rows.append(row)
+        else:
+            new = not self.path.exists()
+            with open(self.path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                if new:
+                    writer.writeheader()
+                writer.writerow(row)
+        return row
+
+    def flush(self):
+        if self.ticks is not None:
+            self.ticks.flush()
+
+    def get_model_vars_dataframe(self):
+        # One row per finished day
+        if self.path is None:
+            return pd.DataFrame(self.rows)
+        return pd.read_csv(self.path) if self.path.exists() else pd.DataFrame()
@@ -0,0 +1,158 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+METRICS = ("Occupancy", "Passes", "Blocked")
+
+
+class CongestionMaps:
+    # Per-cell accumulators updated in place from position changes only, so a tick costs
+    # O(customers who moved) however many stand still:
+    #  - occupancy, in customer-ticks: each cell's occupant count times how long it held
+    #    it, settled whenever the count changes
+    #  - passes: customers stepping onto (or arriving on) the cell
+    #  - blocked moves: steps onto a cell someone already stands on, which the grid lets
+    #    customers share, and random walks with no free cell around
+    # The running totals are also cut into windows of `window` ticks.
+    def __init__(self, width, height, window=60):
+        shape = (width, height)
+        self.count = np.zeros(shape, dtype=np.int32)
+        self.stamp = np.zeros(shape, dtype=np.int64)  # tick the count last changed
+        self.occupancy = np.zeros(shape, dtype=np.int64)
+        self.passes = np.zeros(shape, dtype=np.int64)
+        self.blocked = np.zeros(shape, dtype=np.int64)
+        self.window = window
+        self.window_start = None
+        self.last = tuple(np.zeros(shape, dtype=np.int64) for _ in METRICS)  # totals when the window opened
+        self.windows = []  # (start, end, occupancy, passes, blocked) of every closed window
+
+    # The batch methods index the flattened arrays, one lookup per cell
+    def cells(self, xs, ys):
+        return np.ravel_multi_index((xs, ys), self.count.shape)
+
+    def flat(self):
+        return tuple(array.reshape(-1) for array in (self.count, self.stamp, self.occupancy, self.passes,
+                                                      self.blocked))
+
+    def settle(self, cells, now):
+        # Repeated cells get the same value, so fancy-index assignment is safe here
+        count, stamp, occupancy = self.flat()[:3]
+        occupancy[cells] += count[cells] * (now - stamp[cells])
+        stamp[cells] = now
+
+    def place(self, xs, ys, now, passing=True):
+        if not len(xs):
+            return
+        cells = self.cells(xs, ys)
+        self.settle(cells, now)
+        count, _, _, passes, _ = self.flat()
+        np.add.at(count, cells, 1)
+        if passing:
+            np.add.at(passes, cells, 1)
+
+    def lift(self, xs, ys, now):
+        if not len(xs):
+            return
+        cells = self.cells(xs, ys)
+        self.settle(cells, now)
+        np.subtract.at(self.flat()[0], cells, 1)
+
+    def move(self, old_x, old_y, new_x, new_y, now):
+        old, new = self.cells(old_x, old_y), self.cells(new_x, new_y)
+        moved = old != new
+        if not moved.any():
+            return
+        old, new = old[moved], new[moved]
+        count, _, _, passes, blocked = self.flat()
+        np.add.at(blocked, new[count[new] > 0], 1)
+        self.settle(np.concatenate([old, new]), now)
+        np.subtract.at(count, old, 1)
+        np.add.at(count, new, 1)
+        np.add.at(passes, new, 1)
+
+    def block_many(self, xs, ys):
+        if len(xs):
+            np.add.at(self.blocked, (xs, ys), 1)
+
+    # Single-customer versions for the Mesa engine, which moves one agent at a time
+    def enter(self, pos, now):
+        x, y = pos
+        self.occupancy[x, y] += self.count[x, y] * (now - self.stamp[x, y])
+        self.stamp[x, y] = now
+        self.count[x, y] += 1
+        self.passes[x, y] += 1
+
+    def leave(self, pos, now):
+        x, y = pos
+        self.occupancy[x, y] += self.count[x, y] * (now - self.stamp[x, y])
+        self.stamp[x, y] = now
+        self.count[x, y] -= 1
+
+    def step(self, old, new, now):
+        if self.count[new[0], new[1]] > 0:
+            self.blocked[new[0], new[1]] += 1
+        self.leave(old, now)
+        self.enter(new, now)
+
+    def block(self, pos):
+        self.blocked[pos[0], pos[1]] += 1
+
+    def totals(self, now):
+        # Occupancy, passes and blocked moves since the start, as of tick `now`
+        return (self.occupancy + self.count * (now - self.stamp), self.passes.copy(), self.blocked.copy())
+
+    def advance(self, now):
+        # Called at the start of every tick; closes the window once it is `window` ticks long
+        if self.window_start is None:
+            self.window_start = now
+        elif now - self.window_start >= self.window:
+            self.close_window(now)
+
+    def close_window(self, now):
+        totals = self.totals(now)
+        self.windows.append((self.window_start, now) + tuple(t - l for t, l in zip(totals, self.last)))
+        self.last = totals
+        self.window_start = now
+
+    def close(self, now):
+        # End of the day: the last, possibly shorter, window; the next tick opens a new one
+        if self.window_start is not None and now > self.window_start:
+            self.close_window(now)
+        self.window_start = None
+
+    def to_frame(self):
+        # One row per window and cell with any activity
+        frames = []
+        for start, end, *values in self.windows:
+            xs, ys = np.nonzero(np.any(values, axis=0))
+            frame = pd.DataFrame({"Start Step": start, "End Step": end, "x": xs, "y": ys})
+            for name, value in zip(METRICS, values):
+                frame[name] = value[xs, ys]
+            frames.append(frame)
+        columns = ["Start Step", "End Step", "x", "y", *METRICS]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def write(self, path):
+        # Every window as (windows, width, height) arrays in one .npz
+        shape = (0,) + self.count.shape
+        arrays = {name.lower(): np.stack([w[2 + i] for w in self.windows]) if self.windows else np.zeros(shape)
+                  for i, name in enumerate(METRICS)}
+        np.savez_compressed(Path(path), start=np.array([w[0] for w in self.windows], dtype=np.int64),
+                            end=np.array([w[1] for w in self.windows], dtype=np.int64), **arrays)
+
+
+def merge_maps(maps, now):
+    # Sums maps that covered disjoint sets of customers over the same ticks, e.g. the
+    # strips of canteen.parallel
+    merged = CongestionMaps(*maps[0].count.shape, window=maps[0].window)
+    for part in maps:
+        for total, value in zip((merged.occupancy, merged.passes, merged.blocked), part.totals(now)):
+            total += value
+        merged.count += part.count
+        for last, value in zip(merged.last, part.last):
+            last += value
+    merged.stamp[:] = now
+    merged.window_start = maps[0].window_start
+    for windows in zip(*(part.windows for part in maps)):
+        merged.windows.append(windows[0][:2] + tuple(sum(w[i] for w in windows) for i in range(2, 5)))
+    return merged
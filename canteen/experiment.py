@@ -0,0 +1,116 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .batch import engine_class, replication_seeds, write_results
+from .layout import resolve_layout, subset_layout
+
+# Two-sided 95% Student t quantiles by degrees of freedom; larger samples use the normal value
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+        11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093,
+        20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+
+
+LUNCH = (11, 13)  # the window, in hours of the day, whose arrivals the KPI covers
+
+
+def t_quantile(df):
+    for bound in sorted(T_95):
+        if df <= bound:
+            return T_95[bound]
+    return 1.960
+
+
+def confidence_interval(values):
+    values = np.asarray(values, dtype=np.float64)
+    mean = values.mean()
+    if len(values) < 2:
+        return mean, -math.inf, math.inf
+    half = t_quantile(len(values) - 1) * values.std(ddof=1) / math.sqrt(len(values))
+    return mean, mean - half, mean + half
+
+
+def run_kpi(seed, engine, layout, cashiers, seats, percentile, window, **model_params):
+    # One day with `cashiers` counters and `seats` seats; returns the percentile of the time
+    # from arrival to being served, in minutes, of customers arriving within the window
+    model = engine_class(engine)(seed=seed, layout=subset_layout(layout, cashiers, seats), **model_params)
+    while model.running:
+        model.step()
+    return model.time_to_service_percentile(percentile, *window)
+
+
+def capacity_search(cashiers, seats, max_wait, percentile=95, window=LUNCH, precision=0.5, min_replications=4,
+                    max_replications=40, batch=None, seed=0, processes=None, engine="mesa", layout=None,
+                    assume_monotone=True, output=None, common_random_numbers=True, **model_params):
+    # Sequential stopping over every (cashiers, seats) pair. Each round, the undecided
+    # configurations on the cheap frontier (no undecided configuration uses fewer resources)
+    # get `batch` more replications, until the confidence interval of their mean
+    # P`percentile` time to service (of customers arriving within `window`) is either
+    # narrower than `precision` minutes or clear of `max_wait`. Configurations that use at
+    # least the resources of a confirmed feasible one are then pruned without running, and
+    # with `assume_monotone` so are those using at most the resources of a confirmed
+    # infeasible one. Returns one row per configuration,
+    # with the Pareto set (fewest cashiers and seats that keep the wait under `max_wait`) marked.
+    layout = resolve_layout(layout)
+    configs = [(c, s) for c in sorted(cashiers) for s in sorted(seats)]
+    waits = {config: [] for config in configs}
+    status = dict.fromkeys(configs, "running")
+    batch = batch or processes or 4
+    seeds = replication_seeds(max_replications, seed)
+    params = dict(model_params, common_random_numbers=common_random_numbers)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        while any(state == "running" for state in status.values()):
+            # Every replication i uses seed + i, so configurations are compared on the same days
+            jobs = {}
+            running = [config for config, state in status.items() if state == "running"]
+            for config in running:
+                if any(dominates(other, config) for other in running):
+                    continue
+                done = len(waits[config])
+                count = max(min_replications, done + batch) - done
+                for s in seeds[done:done + count]:
+                    jobs.setdefault(config, []).append(
+                        pool.submit(run_kpi, s, engine, layout, *config, percentile, window, **params))
+            for config, futures in jobs.items():
+                waits[config].extend(future.result() for future in futures)
+                mean, low, high = confidence_interval(waits[config])
+                if high < max_wait:
+                    status[config] = "feasible"
+                elif low > max_wait:
+                    status[config] = "infeasible"
+                elif high - low <= 2 * precision or len(waits[config]) >= max_replications:
+                    status[config] = "feasible" if mean <= max_wait else "infeasible"
+            prune(status, assume_monotone)
+
+    rows = []
+    for config in configs:
+        mean, low, high = confidence_interval(waits[config]) if waits[config] else (math.nan,) * 3
+        rows.append({"Cashiers": config[0], "Seats": config[1], "Replications": len(waits[config]),
+                     f"P{percentile:g} Time To Service": mean, "CI Low": low, "CI High": high, "Status": status[config]})
+    results = pd.DataFrame(rows)
+    feasible = [config for config in configs if status[config] == "feasible"]
+    results["Pareto"] = [status[config] == "feasible" and not any(dominates(other, config) for other in feasible)
+                         for config in configs]
+    results.attrs["replications"] = int(results["Replications"].sum())
+    results.attrs["fixed_replications"] = len(configs) * max_replications
+    if output is not None:
+        write_results(results, output)
+    return results
+
+
+def dominates(a, b):
+    # a needs no more cashiers and seats than b, and fewer of at least one
+    return a[0] <= b[0] and a[1] <= b[1] and a != b
+
+
+def prune(status, assume_monotone):
+    feasible = [config for config, state in status.items() if state == "feasible"]
+    infeasible = [config for config, state in status.items() if state == "infeasible"]
+    for config, state in status.items():
+        if state != "running":
+            continue
+        if any(dominates(other, config) for other in feasible):
+            status[config] = "pruned"
+        elif assume_monotone and any(dominates(config, other) for other in infeasible):
+            status[config] = "pruned"
@@ -0,0 +1,110 @@
+import numpy as np
+
+# Durations in ticks (minutes): joining a queue to being served, arriving to being served,
+# arriving to sitting down, sitting down to getting up, and arriving to leaving
+LATENCIES = ("Time In Queue", "Time To Service", "Time To Seat", "Dwell", "Time In System")
+QUANTILES = (50, 95, 99)
+COUNTS = ("Arrived", "Served", "Seated", "Left", "Left Unserved")
+
+
+class QuantileSketch:
+    # Streaming quantiles of whole-tick durations: one histogram bin per tick, grown on
+    # demand. Durations are bounded by the day, so the sketch stays a few KB however many
+    # customers pass through, and its quantiles are exact. Sketches merge by adding bins.
+    def __init__(self, size=64):
+        self.bins = np.zeros(size, dtype=np.int64)
+        self.count = 0
+        self.total = 0
+
+    def grow(self, value):
+        size = len(self.bins)
+        while size <= value:
+            size *= 2
+        self.bins = np.concatenate([self.bins, np.zeros(size - len(self.bins), dtype=np.int64)])
+
+    def add(self, value):
+        if value >= len(self.bins):
+            self.grow(value)
+        self.bins[value] += 1
+        self.count += 1
+        self.total += value
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        if not len(values):
+            return
+        top = int(values.max())
+        if top >= len(self.bins):
+            self.grow(top)
+        self.bins[:top + 1] += np.bincount(values, minlength=top + 1)
+        self.count += len(values)
+        self.total += int(values.sum())
+
+    def merge(self, other):
+        if len(other.bins) > len(self.bins):
+            self.grow(len(other.bins) - 1)
+        self.bins[:len(other.bins)] += other.bins
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q):
+        # q-th percentile (0-100), the same rank rule as queues.percentile_of_counts
+        if not self.count:
+            return 0
+        return int(np.searchsorted(np.cumsum(self.bins), q / 100 * self.count))
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+
+class LifecycleKPIs:
+    # Stamps each customer's lifecycle timestamps as its state changes and folds the
+    # durations between them into sketches on the spot, so latency KPIs are available at
+    # any tick without keeping agent-level history
+    def __init__(self):
+        self.sketches = {name: QuantileSketch() for name in LATENCIES}
+        self.counts = dict.fromkeys(COUNTS, 0)
+
+    def arrive(self, customer, now):
+        customer.arrived_at = now
+        self.counts["Arrived"] += 1
+
+    def transition(self, customer, old_state, new_state, now):
+        if new_state == "queuing":
+            customer.queued_at = now
+        elif new_state == "ordering":
+            customer.served_at = now
+            self.counts["Served"] += 1
+            if customer.queued_at is not None:
+                self.sketches["Time In Queue"].add(now - customer.queued_at)
+            self.sketches["Time To Service"].add(now - customer.arrived_at)
+        elif new_state == "eating":
+            customer.seated_at = now
+            self.counts["Seated"] += 1
+            self.sketches["Time To Seat"].add(now - customer.arrived_at)
+        if old_state == "eating":
+            self.sketches["Dwell"].add(now - customer.seated_at)
+        if new_state is None:
+            customer.left_at = now
+            self.counts["Left"] += 1
+            if customer.served_at is None:
+                self.counts["Left Unserved"] += 1
+            self.sketches["Time In System"].add(now - customer.arrived_at)
+
+    def merge(self, other):
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+        for name, count in other.counts.items():
+            self.counts[name] += count
+
+    def quantile(self, name, q):
+        return self.sketches[name].quantile(q)
+
+    def summary(self):
+        # Counters plus the mean, P50, P95 and P99 of every latency, e.g. "P95 Time In Queue"
+        summary = dict(self.counts)
+        for name, sketch in self.sketches.items():
+            summary[f"Mean {name}"] = sketch.mean()
+            for q in QUANTILES:
+                summary[f"P{q} {name}"] = sketch.quantile(q)
+        return summary
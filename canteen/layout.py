@@ -0,0 +1,274 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+from .routing import FlowFields, RouteTables
+
+LAYOUT_DIR = Path(__file__).with_name("layouts")
+DEFAULT_LAYOUT = LAYOUT_DIR / "sglc.txt"
+COMPILE_VERSION = 3  # bump when the compiled form changes, so old caches are ignored
+ROUTE_ARRAYS = ("hops", "cells", "classes", "windows", "offsets", "local")
+
+# Cell type codes, stored as uint8 in Layout.cells
+EMPTY = 0
+BOUNDARY = 1
+DINING_AREA = 2
+EXIT_LOCATION = 3
+STORE = 4
+BIG_TABLE = 5
+CASHIER_LOCATION = 6
+
+ELEMENT_TYPES = {BOUNDARY: "boundary",
+                 DINING_AREA: "dining_area",
+                 EXIT_LOCATION: "exit_location",
+                 STORE: "store",
+                 BIG_TABLE: "big_table",
+                 CASHIER_LOCATION: "cashier_location"}
+
+# Symbols of ASCII map files
+MAP_SYMBOLS = {".": EMPTY,
+               "E": EMPTY,  # floor where arriving customers appear
+               "#": BOUNDARY,
+               "o": DINING_AREA,
+               "X": EXIT_LOCATION,
+               "S": STORE,
+               "T": BIG_TABLE,
+               "C": CASHIER_LOCATION}
+
+BLOCKED_TYPES = (BOUNDARY, STORE, BIG_TABLE)  # customers can never step onto these
+FLOOR_TYPES = (EMPTY, CASHIER_LOCATION)  # cells a random walk may wander onto
+
+
+class Layout:
+    def __init__(self, width, height, cashier_location, exit_location, store, dining_areas, big_table, boundaries,
+                 entrances=()):
+        self.width = width
+        self.height = height
+        self.cashier_location = cashier_location
+        self.exit_location = exit_location
+        self.store = store
+        self.dining_areas = dining_areas
+        self.big_table = big_table
+        self.boundaries = boundaries
+        self.entrances = list(entrances)  # cells where arriving customers appear
+        self.source = None  # map file the layout was loaded from
+        self.digest = None  # key of its compiled form in the layout cache
+        self.subset_of = None  # (layout, cashiers, seats) of a subset_layout
+
+        cells = np.zeros((width, height), dtype=np.uint8)
+        # Later element types overwrite earlier ones where they overlap
+        for element_type, positions in ((CASHIER_LOCATION, cashier_location),
+                                        (BOUNDARY, boundaries),
+                                        (DINING_AREA, dining_areas),
+                                        (EXIT_LOCATION, exit_location),
+                                        (STORE, store),
+                                        (BIG_TABLE, big_table)):
+            for x, y in positions:
+                if 0 <= x < width and 0 <= y < height:
+                    cells[x, y] = element_type
+
+        walkable = ~np.isin(cells, BLOCKED_TYPES)
+        floor = np.isin(cells, FLOOR_TYPES)
+        for array in (cells, walkable, floor):
+            array.flags.writeable = False
+        self.cells = cells
+        self.walkable = walkable
+        self.floor = floor
+        self.routes = FlowFields(self)
+
+    def __copy__(self):
+        copied = object.__new__(Layout)
+        copied.__dict__.update(self.__dict__)
+        return copied
+
+    def __reduce__(self):
+        # Layouts travel to worker processes as their map file, their entry in the layout
+        # cache or the layout they are a subset of, so workers memory-map the compiled
+        # routes instead of receiving a copy of them
+        if self.source is not None:
+            return load_layout, (str(self.source),)
+        if self.digest is not None and (layout_cache_dir() / self.digest).exists():
+            return load_compiled, (self.digest,)
+        if self.subset_of is not None:
+            return subset_layout, self.subset_of
+        return super().__reduce__()
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def cell_type(self, pos):
+        return self.cells[pos[0], pos[1]]
+
+    def is_walkable(self, pos):
+        return self.in_bounds(pos) and self.walkable[pos[0], pos[1]]
+
+    def is_floor(self, pos):
+        return self.in_bounds(pos) and self.floor[pos[0], pos[1]]
+
+    def is_exit(self, pos):
+        return self.in_bounds(pos) and self.cells[pos[0], pos[1]] == EXIT_LOCATION
+
+
+def tiled_layout(columns=1, rows=1, tile=None):
+    # A layout repeated on a columns x rows grid of tiles, with walls only around the
+    # outside, e.g. to benchmark bigger floors. Every tile keeps its own entrance,
+    # cashiers, seats and exit.
+    tile = resolve_layout(tile)
+    if columns == rows == 1:
+        return tile
+    width, height = tile.width * columns, tile.height * rows
+    offsets = [(tile.width * c, tile.height * r) for r in range(rows) for c in range(columns)]
+
+    def tiled(positions):
+        return [(x + dx, y + dy) for dx, dy in offsets for x, y in positions]
+
+    def build():
+        boundaries = [(i, 0) for i in range(width)] + [(i, height - 1) for i in range(width)] + \
+                     [(0, j) for j in range(height)]
+        layout = Layout(width, height, tiled(tile.cashier_location), tiled(tile.exit_location), tiled(tile.store),
+                        tiled(tile.dining_areas), tiled(tile.big_table), boundaries, tiled(tile.entrances))
+        return layout_from_cells(layout.cells, layout.entrances)  # same element order as when read from the cache
+
+    if tile.digest is None:
+        return build()
+    return cached_layout(hashlib.sha256(f"{tile.digest}\ntiled {columns}x{rows}".encode()).hexdigest(), build)
+
+def subset_layout(layout, cashiers=None, seats=None):
+    # The same floor with only some cashiers and seats, evenly spread over the originals;
+    # the others become plain floor. Walkability is unchanged, so the layout's compiled
+    # routes still lead to every remaining seat and queue slot and are shared instead of
+    # recomputed.
+    layout = resolve_layout(layout)
+
+    def keep(positions, count):
+        positions = list(dict.fromkeys(positions))
+        if count is None or count >= len(positions):
+            return positions
+        return [positions[i] for i in np.linspace(0, len(positions) - 1, count).round().astype(int)]
+
+    subset = Layout(layout.width, layout.height, keep(layout.cashier_location, cashiers), layout.exit_location,
+                    layout.store, keep(layout.dining_areas, seats), layout.big_table, layout.boundaries,
+                    layout.entrances)
+    if np.array_equal(subset.walkable, layout.walkable):
+        subset.routes.tables = layout.routes.compiled().copy()
+    subset.subset_of = (layout, cashiers, seats)
+    return subset
+
+
+def parse_ascii(text):
+    # One character per cell, see MAP_SYMBOLS; the first line is the top row (highest y)
+    lines = [line.rstrip("\n") for line in text.splitlines() if line.strip() and not line.startswith(";")]
+    width, height = max(len(line) for line in lines), len(lines)
+    cells = np.zeros((width, height), dtype=np.uint8)
+    entrances = []
+    for row, line in enumerate(lines):
+        y = height - 1 - row
+        for x, symbol in enumerate(line):
+            if symbol not in MAP_SYMBOLS:
+                raise ValueError(f"Unknown layout symbol {symbol!r} at line {row + 1}, column {x + 1}")
+            if symbol == "E":
+                entrances.append((x, y))
+            cells[x, y] = MAP_SYMBOLS[symbol]
+    return cells, sorted(entrances, key=lambda pos: (pos[0], pos[1]))
+
+
+def parse_json(text):
+    data = json.loads(text)
+    if "rows" in data:
+        return parse_ascii("\n".join(data["rows"]))
+    cells = np.zeros((data["width"], data["height"]), dtype=np.uint8)
+    for element_type, name in ELEMENT_TYPES.items():
+        for x, y in data.get(name, ()):
+            cells[x, y] = element_type
+    return cells, [tuple(pos) for pos in data.get("entrances", ())]
+
+
+def layout_from_cells(cells, entrances):
+    positions = {element_type: [(int(x), int(y)) for x, y in zip(*np.nonzero(cells == element_type))]
+                 for element_type in ELEMENT_TYPES}
+    return Layout(cells.shape[0], cells.shape[1], positions[CASHIER_LOCATION], positions[EXIT_LOCATION],
+                  positions[STORE], positions[DINING_AREA], positions[BIG_TABLE], positions[BOUNDARY],
+                  [tuple(int(v) for v in pos) for pos in entrances])
+
+
+def compile_layout(layout):
+    # The routes every model will ask for, as arrays, see canteen.routing.compile_routes
+    return layout.routes.compiled().arrays()
+
+
+def load_layout(path=DEFAULT_LAYOUT):
+    path = Path(path)
+    if not path.exists() and (LAYOUT_DIR / path).exists():
+        path = LAYOUT_DIR / path
+    return load_layout_file(path.resolve())
+
+
+@functools.lru_cache(maxsize=None)
+def load_layout_file(path):
+    # Parses an ASCII (.txt) or JSON map once per process, compiled and cached by file hash
+    text = path.read_text()
+    digest = hashlib.sha256(f"{COMPILE_VERSION}\n{text}".encode()).hexdigest()
+
+    def build():
+        return layout_from_cells(*(parse_json(text) if path.suffix == ".json" else parse_ascii(text)))
+
+    layout = cached_layout(digest, build)
+    layout.source = path
+    return layout
+
+
+@functools.lru_cache(maxsize=None)
+def load_compiled(digest):
+    # A layout straight from the layout cache, e.g. a tiled floor sent to a worker process
+    return cached_layout(digest, None)
+
+
+def cached_layout(digest, build):
+    # The compiled routes are cached on disk under the digest, so a big floor is only solved
+    # once. The next-hop fields are memory-mapped read-only: models index them in place, and
+    # processes on one machine share their pages.
+    cache = layout_cache_dir() / digest
+    if (cache / "route_hops.npy").exists():
+        layout = layout_from_cells(np.load(cache / "cells.npy"), np.load(cache / "entrances.npy").tolist())
+        layout.routes.tables = RouteTables(**{name: np.asarray(np.load(cache / f"route_{name}.npy", mmap_mode="r"))
+                                              for name in ROUTE_ARRAYS})
+    else:
+        layout = build()
+        routes = {f"route_{name}": array for name, array in compile_layout(layout).items()}
+        write_cache(cache, cells=layout.cells, entrances=np.array(layout.entrances, dtype=np.int32).reshape(-1, 2),
+                    **routes)
+    layout.digest = digest
+    return layout
+
+
+def resolve_layout(layout=None, width=None, height=None):
+    # A Layout, a map file (path or name under canteen/layouts) or None for the SGLC canteen
+    if not isinstance(layout, Layout):
+        layout = load_layout(layout or DEFAULT_LAYOUT)
+    if (width is not None and width != layout.width) or (height is not None and height != layout.height):
+        raise ValueError(f"The layout is {layout.width}x{layout.height}, not {width}x{height}")
+    return layout
+
+
+def cache_root():
+    return Path(os.environ.get("CANTEEN_CACHE", Path.home() / ".cache" / "canteen"))
+
+
+def layout_cache_dir():
+    return cache_root() / "layouts"
+
+
+def write_cache(directory, **arrays):
+    # Written next to the final directory and renamed, so readers never see half a cache
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    partial = Path(tempfile.mkdtemp(dir=directory.parent))
+    for name, array in arrays.items():
+        np.save(partial / f"{name}.npy", array)
+    try:
+        partial.rename(directory)
+    except OSError:
+        shutil.rmtree(partial, ignore_errors=True)  # another process got there first
@@ -0,0 +1,235 @@
+import json
+import queue
+import threading
+from pathlib import Path
+from time import perf_counter, sleep
+import tornado.ioloop
+import tornado.web
+import tornado.websocket
+import mesa_viz_tornado
+from .model import CanteenModel
+from .snapshot import restore_snapshot, take_snapshot
+from .trajectory import ReplayModel, Trajectory
+from .visualization import STATIC_DIR
+
+TEMPLATE_DIR = Path(__file__).with_name("templates")
+MESA_TEMPLATE_DIR = str(Path(mesa_viz_tornado.__file__).with_name("templates"))  # bootstrap, Chart.js
+
+# Model parameters a snapshot already carries, so seeking back does not pass them again
+SNAPSHOT_PARAMS = ("width", "height", "layout", "seed", "common_random_numbers", "queue_capacity", "queue_policy",
+                   "arrival_profile", "arrival_times")
+
+
+class SimulationRunner(threading.Thread):
+    # Steps a headless model in a background thread, either flat out or at `speed` ticks
+    # per second, and renders the visualization elements at most `fps` times a second.
+    # Frames go to `publish`; commands arrive through a queue, so only this thread ever
+    # touches the model. A snapshot every `snapshot_every` ticks lets seek jump back
+    # without replaying the day from the start.
+    def __init__(self, elements, publish, model_params=None, fps=10, speed=None, snapshot_every=60):
+        super().__init__(daemon=True)
+        self.elements = elements
+        self.publish = publish
+        self.model_params = model_params or {}
+        self.restore_params = {k: v for k, v in self.model_params.items() if k not in SNAPSHOT_PARAMS}
+        self.fps = fps
+        self.speed = speed  # ticks per second, None for as fast as possible
+        self.snapshot_every = snapshot_every
+        self.paused = True
+        self.commands = queue.Queue()
+        self.model = None
+        self.snapshots = {}
+
+    def submit(self, command, value=None):
+        # Thread-safe; called from the server's event loop
+        self.commands.put((command, value))
+
+    def stop(self):
+        self.submit("stop")
+
+    def reset(self):
+        self.model = CanteenModel(**self.model_params)
+        self.snapshots = {0: take_snapshot(self.model)}
+        self.publish({"type": "reset"})
+
+    def seek(self, step):
+        # Restart from the last snapshot at or before `step` when going back, then run forward
+        model = self.model
+        if step < model.schedule.steps:
+            start = max(s for s in self.snapshots if s <= step)
+            model = self.model = restore_snapshot(self.snapshots[start], **self.restore_params)
+            self.publish({"type": "reset"})
+        while model.running and model.schedule.steps < step:
+            self.advance()
+
+    def advance(self):
+        self.model.step()
+        steps = self.model.schedule.steps
+        if steps % self.snapshot_every == 0 and steps not in self.snapshots:
+            self.snapshots[steps] = take_snapshot(self.model)
+
+    def handle(self, command, value):
+        if command == "play":
+            self.paused = False
+        elif command == "pause":
+            self.paused = True
+        elif command == "step":
+            if self.model.running:
+                self.advance()
+        elif command == "speed":
+            self.speed = float(value) if value else None
+        elif command == "seek":
+            self.seek(max(0, int(value)))
+        elif command == "reset":
+            self.reset()
+        elif command == "refresh":
+            for element in self.elements:
+                if hasattr(element, "model"):
+                    element.model = None  # resend the full floor plan to a new viewer
+
+    def frame(self):
+        model = self.model
+        return {"type": "frame",
+                "step": model.schedule.steps,
+                "time": model.get_time_string(),
+                "running": model.running,
+                "end": round((model.end_time - model.start_time) * 60),
+                "paused": self.paused,
+                "speed": self.speed,
+                "data": [element.render(model) for element in self.elements]}
+
+    def run(self):
+        self.reset()
+        interval = 1 / self.fps
+        last_frame = next_tick = perf_counter()
+        dirty = True
+        while True:
+            idle = self.paused or not self.model.running
+            try:
+                # Block while idle, but never longer than a frame
+                command, value = self.commands.get(timeout=interval) if idle else self.commands.get_nowait()
+            except queue.Empty:
+                command = None
+            if command == "stop":
+                return
+            if command is not None:
+                self.handle(command, value)
+                dirty = True
+                next_tick = perf_counter()
+            elif not idle:
+                self.advance()
+                dirty = True
+                if not self.model.running:
+                    self.paused = True  # the day is over; seeking back shows it paused there
+                if self.speed:
+                    next_tick += 1 / self.speed
+                    delay = next_tick - perf_counter()
+                    if delay > 0:
+                        sleep(min(delay, interval))
+                    else:
+                        next_tick = perf_counter()  # fell behind; do not try to catch up
+
+            now = perf_counter()
+            if dirty and now - last_frame >= interval:
+                self.publish(self.frame())
+                last_frame, dirty = now, False
+
+
+class ReplayRunner(SimulationRunner):
+    # Plays a day recorded with `record_to` instead of simulating one: stepping and
+    # seeking read frames from the memory-mapped file
+    def __init__(self, elements, publish, path, fps=10, speed=None):
+        super().__init__(elements, publish, fps=fps, speed=speed)
+        self.trajectory = Trajectory(path)
+
+    def reset(self):
+        self.model = ReplayModel(self.trajectory)
+        self.publish({"type": "reset"})
+
+    def seek(self, step):
+        if step < self.model.schedule.steps:
+            self.model = ReplayModel(self.trajectory, step)  # a new view, so the grid redraws
+            self.publish({"type": "reset"})
+        else:
+            self.model.seek(step)
+
+    def advance(self):
+        self.model.step()
+
+
+class PageHandler(tornado.web.RequestHandler):
+    def get(self):
+        app = self.application
+        self.render("live.html", model_name=app.model_name, js_includes=app.local_js_includes,
+                    package_js_includes=app.package_js_includes, scripts=app.js_code)
+
+
+class SocketHandler(tornado.websocket.WebSocketHandler):
+    def open(self):
+        self.application.clients.add(self)
+        self.application.runner.submit("refresh")
+
+    def on_close(self):
+        self.application.clients.discard(self)
+
+    def check_origin(self, origin):
+        return True
+
+    def on_message(self, message):
+        msg = json.loads(message)
+        if msg["type"] in ("play", "pause", "step", "speed", "seek", "reset"):
+            self.application.runner.submit(msg["type"], msg.get("value"))
+
+
+class LiveServer(tornado.web.Application):
+    # Dashboard for a model running at its own pace in a SimulationRunner. Every
+    # connected browser gets the same frames, pushed at the runner's frame rate, and can
+    # play, pause, step, seek to a tick, change the speed or reset. With `replay`, the
+    # directory of a recorded day, it plays that day back instead.
+    def __init__(self, visualization_elements, name="SGLC Canteen Model Simulation", model_params=None, fps=10,
+                 speed=None, port=8521, replay=None):
+        self.port = port
+        self.model_name = name
+        self.clients = set()
+        self.loop = None
+        # Serve each element's scripts the way ModularServer does, so the same elements work in both
+        self.package_js_includes, self.local_js_includes, self.js_code = set(), set(), []
+        handlers = [(r"/", PageHandler), (r"/ws", SocketHandler),
+                    (r"/static/(.*)", tornado.web.StaticFileHandler, {"path": MESA_TEMPLATE_DIR}),
+                    (r"/live/(.*)", tornado.web.StaticFileHandler, {"path": str(STATIC_DIR)})]
+        for element in visualization_elements:
+            self.package_js_includes.update(element.package_includes)
+            if element.local_includes:
+                folder = element.__class__.__name__
+                handlers.append((rf"/local/{folder}/(.*)", tornado.web.StaticFileHandler,
+                                 {"path": element.local_dir}))
+                self.local_js_includes.update(f"{folder}/{name}" for name in element.local_includes)
+            self.js_code.append(element.js_code)
+        if replay is not None:
+            self.runner = ReplayRunner(visualization_elements, self.publish, replay, fps=fps, speed=speed)
+        else:
+            self.runner = SimulationRunner(visualization_elements, self.publish, model_params, fps=fps, speed=speed)
+        super().__init__(handlers, template_path=str(TEMPLATE_DIR))
+
+    def publish(self, message):
+        # Called from the runner thread; hand the message over to the event loop
+        if self.loop is not None:
+            self.loop.add_callback(self.broadcast, json.dumps(message))
+
+    def broadcast(self, message):
+        for client in list(self.clients):
+            try:
+                client.write_message(message)
+            except tornado.websocket.WebSocketClosedError:
+                self.clients.discard(client)
+
+    def launch(self, port=None):
+        self.port = port or self.port
+        self.listen(self.port)
+        self.loop = tornado.ioloop.IOLoop.current()
+        self.runner.start()
+        print(f"Interface starting at http://127.0.0.1:{self.port}")
+        try:
+            self.loop.start()
+        except KeyboardInterrupt:
+            self.loop.stop()
@@ -1,143 +1,259 @@
 from mesa import Model
-from mesa.time import RandomActivation
 from mesa.space import MultiGrid
 from mesa.datacollection import DataCollector
-from .agents import Customer, StaticElement
-import random
+import copy
+import numpy as np
+from .agents import Customer
+from .layout import resolve_layout
+from .seating import SeatIndex
+from .queues import CashierQueues
+from .rng import RandomStreams
+from .collector import MODEL_REPORTERS, STATES, MemoryCollector, StreamingCollector, time_string
+from .scheduler import HybridActivation
+from .arrivals import arrival_times_for, arrival_hours
+from .profiling import Profiler
+from .kpis import LifecycleKPIs
+from .trajectory import TrajectoryRecorder
+from .congestion import CongestionMaps
 
 class CanteenModel(Model):
-    def __init__(self, width, height):
+    def __init__(self, width=None, height=None, queue_capacity=5, queue_policy="shortest", verbose=False, seed=None,
+                 common_random_numbers=False, collect_to=None, chunk_ticks=240, agent_sample_every=None,
+                 collect_format="npz", record_to=None, arrival_profile=None, arrival_times=None, profile=False, layout=None,
+                 congestion=False):
         super().__init__()
-        self.grid = MultiGrid(width, height, False)
-        self.schedule = RandomActivation(self)
+        self.verbose = verbose
+        # Every draw goes through a per-purpose stream of this model's seed. With common random numbers,
+        # each customer's service and dwell times are drawn on arrival, so scenarios that differ only in
+        # layout or queueing still see the same customers.
+        self.streams = RandomStreams(seed)
+        self.random = self.streams.activation  # used by the scheduler to shuffle agents
+        self.common_random_numbers = common_random_numbers
+        # The floor plan never changes, so it lives in a compiled cell-type array
+        # instead of the grid and schedule; only customers are agents
+        self.layout = resolve_layout(layout, width, height)
+        self.grid = MultiGrid(self.layout.width, self.layout.height, False)
+        self.schedule = HybridActivation(self)
         self.current_id = 0
         self.start_time = 6  # Simulation starts at 6 AM
         self.end_time = 18  # Simulation ends at 6 PM
         self.current_time = self.start_time
 
-        self.steps_since_last_customer = 0
-
-        self.entry_point = (41, random.randint(0, 22))
-        self.cashier_location = [(2, 19), (6, 19), (10, 19), (14, 19), (18, 19), (22, 19), (3, 19), (7, 19), (11, 19), (15, 19), (19, 19), (23, 19), (4, 19), (8, 19), (12, 19), (16, 19), (20, 19), (24, 19), (5, 19), (9, 19), (13, 19), (17, 19), (21, 19), (25, 19)]
-        self.exit_location = [(43, i) for i in range(1, 23)]
-        self.store = [(i+2, 20) for i in range(24)] + [(i+2, 21) for i in range(24)] + [(i+2, 22) for i in range(24)]
-
-        self.dining_areas = [(3 * (i + 1), 14) for i in range(11)] + [(3 * (j + 1) + 1, 14) for j in range(11)] + \
-                            [(3 * (i + 1), 15) for i in range(11)] + [(3 * (j + 1) + 1, 15) for j in range(11)] + \
-                            [(3 * (i + 1), 10) for i in range(11)] + [(3 * (j + 1) + 1, 10) for j in range(11)] + \
-                            [(3 * (i + 1), 11) for i in range(11)] + [(3 * (j + 1) + 1, 11) for j in range(11)] + \
-                            [(33, 2), (33, 3), (34, 2), (34, 3), (33, 5), (33, 6), (34, 5), (34, 6),(33, 20), (34, 20), (33, 21), (34, 21), (31, 20), (30, 20), (31, 21), (30, 21)] + \
-                            [(6, i + 3) for i in range(4)] + [(7, 3), (7, 6)] + [(8, 3), (8, 6)] + [(9, i + 3) for i in range(4)] + \
-                            [(13, i + 3) for i in range(4)] + [(14, 3), (14, 6)] + [(15, 3), (15, 6)] + [(16, i + 3) for i in range(4)] + \
-                            [(20, i + 3) for i in range(4)] + [(21, 3), (21, 6)] + [(22, 3), (22, 6)] + [(23, i + 3) for i in range(4)] + \
-                            [(27, i + 3) for i in range(4)] + [(28, 3), (28, 6)] + [(29, 3), (29, 6)] + [(30, i + 3) for i in range(4)]
-        self.big_table = [(7, 4), (7, 5), (8, 4), (8, 5)] + [(14, 4), (14, 5), (15, 4), (15, 5)] + [(21, 4), (21, 5), (22, 4), (22, 5)] + [(28, 4), (28, 5), (29, 4), (29, 5)]
-        self.boundaries = [(i, 0) for i in range(width)] + [(i, 23) for i in range(44)] +\
-                          [(0, j) for j in range(height)] 
-
-        self.next_customer_time = self.random_time_between(0, 60)
-
-        self.datacollector = DataCollector(
-            agent_reporters={"State": "state"},
-            model_reporters={"Current Time": "current_time",
-                             "Formatted Time": lambda m: m.get_time_string(),
-                             "Entering": lambda m: self.count_customers_by_state("entering"),
-                             "Queuing": lambda m: self.count_customers_by_state("queuing"),
-                             "Ordering": lambda m: self.count_customers_by_state("ordering"),
-                             "Eating": lambda m: self.count_customers_by_state("eating"),
-                             "Exiting": lambda m: self.count_customers_by_state("exiting")}
-        )
-
-        for boundary in self.boundaries:
-            self.add_static_element(boundary, "boundary")
-
-        for dining_area in self.dining_areas:
-            self.add_static_element(dining_area, "dining_area")
-
-        for exit_loc in self.exit_location:
-            self.add_static_element(exit_loc, "exit_location")
-        
-        for store_loc in self.store:
-            self.add_static_element(store_loc, "store")
-            
-        for big_table_loc in self.big_table:
-            self.add_static_element(big_table_loc, "big_table")
-
-    def add_static_element(self, pos, element_type):
-        element = StaticElement(self.next_id(), self, element_type)
-        self.grid.place_agent(element, pos)
-        self.schedule.add(element)
-
-    def random_time_between(self, start, end):
-        return random.uniform(start, end)
+        # Live per-state counters and agent sets, kept up to date by Customer.state
+        self.state_counts = dict.fromkeys(STATES, 0)
+        self.customers_by_state = {state: set() for state in STATES}
+        self.lifecycle = LifecycleKPIs()
+
+        self.entry_point = self.draw_entrance()
+
+        self.cashier_location = self.layout.cashier_location
+        self.exit_location = self.layout.exit_location
+        self.store = self.layout.store
+        self.dining_areas = self.layout.dining_areas
+        self.big_table = self.layout.big_table
+        self.boundaries = self.layout.boundaries
+        self.seats = SeatIndex(self.dining_areas)
+        self.queues = CashierQueues(self.layout, capacity=queue_capacity, policy=queue_policy,
+                                    rng=self.streams.service, choice_rng=self.streams.routing,
+                                    wake=self.schedule.wake)
+
+        # The whole day's arrivals are drawn up front and released as the clock passes them
+        self.arrival_times = arrival_times_for(arrival_profile, arrival_times,
+                                               self.streams.generator("arrival_times"), self.start_time, self.end_time)
+        self.arrival_cursor = 0
+
+        if collect_to is None and agent_sample_every:
+            # Sampled agents are kept in memory, as the chunks collect_to would write
+            self.datacollector = MemoryCollector(MODEL_REPORTERS, chunk_ticks=chunk_ticks, agent_every=agent_sample_every)
+        elif collect_to is None:
+            self.datacollector = DataCollector(model_reporters=MODEL_REPORTERS)
+        else:
+            # Stream fixed-size chunks to disk instead of growing in-memory lists all day
+            self.datacollector = StreamingCollector(collect_to, MODEL_REPORTERS, chunk_ticks=chunk_ticks,
+                                                    agent_every=agent_sample_every, fmt=collect_format)
+
+        # Every customer's position and state per tick, for replaying the day without simulating it
+        self.recorder = TrajectoryRecorder(record_to, chunk_ticks=chunk_ticks) if record_to is not None else None
+
+        # Per-cell occupancy, passes and blocked moves, in hourly windows or every `congestion` ticks
+        self.congestion = None
+        if congestion:
+            self.track_congestion(60 if congestion is True else congestion)
+
+        self.profiler = None
+        if profile:
+            self.instrument()
+
+    def track_congestion(self, window):
+        # Every position change goes through the grid, so wrapping its methods covers them
+        # all; a model built without congestion maps runs the plain grid. The maps are looked
+        # up on every call, so a restored snapshot can swap in its own.
+        self.congestion = CongestionMaps(self.layout.width, self.layout.height, window)
+        grid, schedule = self.grid, self.schedule
+        place_agent, remove_agent = grid.place_agent, grid.remove_agent
+
+        def placed(agent, pos):
+            place_agent(agent, pos)
+            self.congestion.enter(pos, schedule.steps)
+
+        def moved(agent, pos):
+            # What MultiGrid.move_agent does, through the unwrapped methods so a move counts once
+            self.congestion.step(agent.pos, pos, schedule.steps)
+            remove_agent(agent)
+            place_agent(agent, pos)
+
+        def removed(agent):
+            self.congestion.leave(agent.pos, schedule.steps)
+            remove_agent(agent)
+
+        grid.place_agent, grid.move_agent, grid.remove_agent = placed, moved, removed
+
+    def instrument(self):
+        # Per-phase timers, search-helper counters and agents per tick, see canteen.profiling
+        profiler = self.profiler = Profiler()
+        profiler.time(self.datacollector, "collect", "datacollector.collect")
+        profiler.time(self.schedule, "step", "schedule.step")
+        profiler.time(self, "add_customer")
+        profiler.time(self, "report_time", "print")
+        profiler.time(self, "find_empty_seat")
+        profiler.count(self.seats, "nearest_free", "seats.nearest_free")
+        profiler.count(self.seats, "any_free", "seats.any_free")
+        profiler.time(self.queues, "join", "queues.join")
+        # Customers route through the layout's flow fields; wrap a private copy of them
+        self.layout = copy.copy(self.layout)
+        self.layout.routes = copy.copy(self.layout.routes)
+        profiler.time(self.layout.routes, "step_towards", "move_towards")
+        profiler.time(self.layout.routes, "step_to_exit")
+        profiler.track_agents(self, lambda: len(self.schedule._agents))
 
     def add_customer(self):
-        c = Customer(self.current_id, self)
+        c = self.new_customer()
         self.schedule.add(c)
-        self.grid.place_agent(c, (41, random.randint(0, 22)))
+        self.grid.place_agent(c, self.draw_entrance())
+        self.lifecycle.arrive(c, self.schedule.steps)
+        if self.common_random_numbers:
+            c.planned_service_time = self.queues.draw_service_time()
+            c.dwell_time = self.draw_dwell_time()
         self.current_id += 1
-        self.next_customer_time = self.current_time + self.random_time_between(0, 720)
+
+    def new_customer(self):
+        return Customer(self.current_id, self)
+
+    def draw_entrance(self):
+        entrances = self.layout.entrances
+        return entrances[self.streams.arrivals.randrange(len(entrances))]
+
+    def restore_customer(self, fields):
+        # Recreates a customer from a snapshot, see canteen.snapshot
+        c = Customer(fields["unique_id"], self)
+        for name, value in fields.items():
+            if name not in ("unique_id", "pos"):
+                setattr(c, name, value)
+        self.schedule.add(c)
+        self.grid.place_agent(c, tuple(fields["pos"]))
+        return c
+
+    def release_arrivals(self):
+        # Number of scheduled arrivals the clock has just passed
+        cursor = int(np.searchsorted(self.arrival_times, self.current_time))
+        count, self.arrival_cursor = cursor - self.arrival_cursor, cursor
+        return count
 
     def find_empty_seat(self, current_pos):
-        empty_seats = [seat for seat in self.dining_areas if self.is_seat_empty_for_customer(seat)]
-        if not empty_seats:
+        if not self.seats:
             return None
-        return random.choice(empty_seats) if random.choice([True, False]) else min(empty_seats, key=lambda x: self.manhattan_distance(current_pos, x))
+        rng = self.streams.seating
+        return self.seats.any_free(rng) if rng.choice([True, False]) else self.seats.nearest_free(current_pos)
 
-    def find_empty_queue(self, current_pos):
-        empty_queues = [queue for queue in self.cashier_location if self.grid.is_cell_empty(queue)]
-        if not empty_queues:
-            return None
-        # Randomly choose an empty queue
-        return random.choice(empty_queues)
+    def draw_dwell_time(self):
+        return self.streams.dwell.randint(20, 30)  # Eating takes 20 to 30 steps (minutes)
 
     def manhattan_distance(self, pos1, pos2):
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
     def get_time_string(self):
-        total_minutes = self.current_time * 60
-        hours = int(total_minutes // 60)
-        minutes = int(total_minutes % 60)
-        return f"{hours:02d}:{minutes:02d}"
+        return time_string(self.current_time)
 
     def count_customers_by_state(self, state):
-        count = 0
-        for agent in self.schedule.agents:
-            if isinstance(agent, Customer) and agent.state == state:
-                count += 1
-        return count
+        return self.state_counts[state]
+
+    def queue_length(self):
+        return len(self.queues)
+
+    def door_length(self):
+        return len(self.queues.waiting)
+
+    def serving_count(self):
+        # Customers at a counter, waiting for their order
+        return sum(1 for customer in self.customers_by_state["ordering"] if customer.counter is not None)
+
+    def mean_wait(self):
+        return self.queues.mean_wait()
+
+    def wait_percentile(self, q):
+        return self.queues.wait_percentile(q)
+
+    def latency_percentile(self, name, q):
+        # e.g. latency_percentile("Time In System", 95), see canteen.kpis.LATENCIES
+        return self.lifecycle.quantile(name, q)
+
+    def time_to_service_percentile(self, q, start=None, end=None):
+        # Only customers who arrived between the start and end hours, e.g. 11 and 13 for lunch
+        return self.queues.time_to_service_percentile(q, arrival_hours(self, start, end))
+
+    def agent_snapshot(self):
+        agents = list(self.schedule.agents)
+        return ([a.unique_id for a in agents], [STATES.index(a.state) for a in agents],
+                [a.pos[0] for a in agents], [a.pos[1] for a in agents])
+
+    def transition(self, customer, old_state, new_state):
+        if old_state is not None:
+            self.state_counts[old_state] -= 1
+            self.customers_by_state[old_state].discard(customer)
+        if new_state is not None:
+            self.state_counts[new_state] += 1
+            self.customers_by_state[new_state].add(customer)
+        if customer.arrived_at is not None:  # not while a customer is being created or restored
+            self.lifecycle.transition(customer, old_state, new_state, self.schedule.steps)
+
+    def remove_customer(self, customer):
+        self.transition(customer, customer.state, None)
+        self.grid.remove_agent(customer)
+        self.schedule.remove(customer)
+        customer.remove()
 
     def step(self):
         self.datacollector.collect(self)
+        if self.recorder is not None:
+            self.recorder.record(self)
+        if self.congestion is not None:
+            self.congestion.advance(self.schedule.steps)
+        if self.queues.waiting and int(self.current_time) > 16:
+            # Closing time: customers parked at the door are woken up to be turned away
+            for customer in self.queues.waiting:
+                self.schedule.wake(customer)
         self.schedule.step()
 
-        current_hour = int(self.current_time)
-        if self.current_time < 16:  # Only add customers before 4 PM
-            if self.current_time >= self.next_customer_time:
-                self.add_customer()
-                self.next_customer_time = self.current_time + self.random_time_between(0, 1)  # Schedule next customer
-
         self.current_time += 1 / 60  # Assume one step is one minute
+        for _ in range(self.release_arrivals()):
+            self.add_customer()
 
         if self.current_time >= self.end_time:
             self.running = False
-
-        self.steps_since_last_customer += 1
-
-        if self.steps_since_last_customer >= 1:
-            if 7 <= current_hour < 16:
-                if 11 <= current_hour < 13:
-                    self.add_customer()
-                self.add_customer()
-            self.steps_since_last_customer = 0
+            if isinstance(self.datacollector, StreamingCollector):
+                self.datacollector.flush()
+            if self.recorder is not None:
+                self.recorder.close(self)
+            if self.congestion is not None:
+                self.congestion.close(self.schedule.steps)
 
         # Print the current time in HH:MM format
+        if self.verbose:
+            self.report_time()
+
+    def report_time(self):
         print(self.get_time_string())
-        
+
     def is_seat_empty_for_customer(self, pos):
-        # Check if the cell at `pos` contains any Customer agents
-        cell_contents = self.grid.get_cell_list_contents(pos)
-        for agent in cell_contents:
-            if isinstance(agent, Customer):
-                return False
-        return True
+        # Seats are marked occupied when a customer sits down and freed when they leave
+        return self.seats.is_free(pos)
@@ -0,0 +1,121 @@
+import numpy as np
+from .arrivals import DEFAULT_PROFILE, ArrivalProfile
+from .collector import DailySummaryCollector, StreamingCollector
+from .kpis import LifecycleKPIs
+from .model import CanteenModel
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Arrival profile per weekday; days without one are closed
+DEFAULT_WEEK = {**dict.fromkeys(WEEKDAYS[:5], DEFAULT_PROFILE),
+                "Saturday": {8: 30, 11: 60, 13: 30, 15: 0}}
+
+
+class MultiDayModel(CanteenModel):
+    # Runs `days` consecutive days in one model. At closing time everyone still inside is
+    # sent home, the clock, scheduler and queue statistics start over, and the next day's
+    # arrivals are drawn from its weekday's profile. Customers are pooled and reused, and
+    # each day is kept as one summary row (written to `summary_to` if given) instead of
+    # per-tick data, so memory stays flat however many days run. Ticks can still be
+    # streamed to disk with `collect_to`.
+    def __init__(self, days=7, weekday_profiles=None, first_weekday="Monday", summary_to=None, profile=False,
+                 **model_params):
+        profiles = DEFAULT_WEEK if weekday_profiles is None else weekday_profiles
+        unknown = sorted(set(profiles) - set(WEEKDAYS))
+        if unknown:
+            raise ValueError(f"Unknown weekdays: {', '.join(map(str, unknown))}")
+        if first_weekday not in WEEKDAYS:
+            raise ValueError(f"Unknown weekday: {first_weekday}")
+        # Recordings and congestion windows are laid out along a single day's ticks, which
+        # start over every morning here
+        if model_params.get("record_to") is not None or model_params.get("congestion"):
+            raise ValueError("record_to and congestion cover a single day; run MultiDayModel without them")
+        # Arrivals are drawn per day from the weekday's profile
+        if model_params.get("arrival_profile") is not None or model_params.get("arrival_times") is not None:
+            raise ValueError("MultiDayModel draws arrivals from weekday_profiles; pass arrival profiles there")
+        self.days = days
+        self.weekday_profiles = {day: p if isinstance(p, ArrivalProfile) else ArrivalProfile(p)
+                                 for day, p in profiles.items() if p is not None}
+        self.first_weekday = WEEKDAYS.index(first_weekday)
+        self.pool = []  # customers who left, ready to come back as new arrivals
+        super().__init__(**model_params)
+
+        ticks = self.datacollector if isinstance(self.datacollector, StreamingCollector) else None
+        self.datacollector = DailySummaryCollector(summary_to, ticks)
+        # One generator for the whole run, so every day gets fresh arrivals
+        self.arrival_rng = self.streams.generator("arrival_times")
+        self.day = 0
+        self.start_day()
+        if profile:
+            self.instrument()
+
+    @property
+    def weekday(self):
+        return WEEKDAYS[(self.first_weekday + self.day) % len(WEEKDAYS)]
+
+    def new_customer(self):
+        if not self.pool:
+            return super().new_customer()
+        c = self.pool.pop()
+        c.reuse(self.current_id)
+        return c
+
+    def remove_customer(self, customer):
+        super().remove_customer(customer)
+        self.pool.append(customer)
+
+    def start_day(self):
+        profile = self.weekday_profiles.get(self.weekday)
+        self.arrival_times = (profile.generate(self.arrival_rng, self.start_time, self.end_time)
+                              if profile is not None else np.empty(0))
+        self.arrival_cursor = 0
+
+    def day_summary(self):
+        queues = self.queues
+        return {"Day": self.day,
+                "Weekday": self.weekday,
+                "Mean Queue Wait": queues.mean_wait(),
+                "P95 Queue Wait": queues.wait_percentile(95),
+                **self.lifecycle.summary()}
+
+    def close(self):
+        # Send everyone still inside home; nobody waits at the door overnight
+        self.queues.waiting.clear()
+        for customer in list(self.schedule._agents):
+            if customer.counter is not None:
+                self.queues.leave(customer)
+            if customer.seat is not None:
+                self.seats.release(customer.seat)
+            self.remove_customer(customer)
+
+    def reset_day(self):
+        self.current_time = self.start_time
+        schedule = self.schedule
+        schedule.steps = 0
+        schedule.time = 0
+        schedule.wakeups.clear()
+        schedule.parked.clear()
+        queues = self.queues
+        queues.joined_at.clear()
+        queues.served = 0
+        queues.total_wait = 0
+        queues.wait_counts.clear()
+        queues.time_to_service_counts.clear()
+        self.lifecycle = LifecycleKPIs()
+
+    def end_day(self):
+        summary = self.day_summary()
+        self.close()
+        self.datacollector.end_day(summary)
+        self.day += 1
+        if self.day < self.days:
+            self.reset_day()
+            self.start_day()
+            self.running = True
+        else:
+            self.datacollector.flush()
+
+    def step(self):
+        super().step()
+        if not self.running:
+            self.end_day()
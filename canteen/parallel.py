@@ -0,0 +1,331 @@
+import multiprocessing
+from collections import Counter, defaultdict
+import numpy as np
+from .congestion import merge_maps
+from .kpis import LifecycleKPIs
+from .profiling import Profiler
+from .vectorized import VectorizedCanteenModel, ENTERING, EXITING, ORDERING, GONE
+
+
+class ParallelCanteenModel(VectorizedCanteenModel):
+    # The vectorized engine with the floor cut into `workers` vertical strips of equal
+    # width, each stepped by a TileEngine in its own process. This model keeps what every
+    # strip shares: the arrival schedule, customers still at the entrance or the door, the
+    # queue tickets and the seat index. At the end of a tick the strips report who is
+    # being served and who is looking for a seat, so at the start of the next one this
+    # model frees the counters whose service ends and hands out seats in customer order,
+    # and sends each strip its new and crossing customers, the occupied cells just outside
+    # it (the halo), the queue heads and its seats: one exchange per tick. Only the
+    # per-strip random walks, and service and dwell times drawn at the counter or table,
+    # use other random streams than the vectorized engine, so with common random numbers
+    # and no customer left standing for want of a seat both engines produce the same day.
+    def __init__(self, width=None, height=None, workers=4, **model_params):
+        super().__init__(width, height, **model_params)
+        self.bounds = np.unique(np.linspace(0, self.width, min(workers, self.width) + 1).astype(int))
+        tile_params = dict(layout=self.layout, queue_capacity=self.queue_capacity, queue_policy=self.queue_policy,
+                           seed=self.streams.seed, common_random_numbers=self.common_random_numbers,
+                           arrival_times=(), congestion=self.congestion.window if self.congestion else False)
+        self.pipes, self.processes = [], []
+        for index, (lo, hi) in enumerate(zip(self.bounds[:-1], self.bounds[1:])):
+            pipe, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_tile, args=(child, index, int(lo), int(hi), tile_params),
+                                              daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(pipe)
+            self.processes.append(process)
+        tiles = len(self.pipes)
+        self.incoming = [[] for _ in range(tiles)]  # customers handed to each strip next tick
+        self.edges = [np.zeros((0, 2), dtype=np.int16) for _ in range(tiles)]  # cells on and next to each border
+        self.tile_counts = np.zeros((tiles, GONE), dtype=np.int64)
+        # Customers at a counter (uid, counter, timer, x, y) and looking for a seat (uid, x, y)
+        # at the end of the last tick, as the strips reported them
+        self.heads = tuple(np.zeros(0, dtype=np.int64) for _ in range(5))
+        self.seekers = tuple(np.zeros(0, dtype=np.int64) for _ in range(3))
+        self.gathered = None
+
+    def instrument(self):
+        profiler = self.profiler = Profiler()
+        profiler.time(self.datacollector, "collect", "datacollector.collect")
+        for phase in ("step_customers", "exchange", "add_customers", "compact", "report_time"):
+            profiler.time(self, phase, "print" if phase == "report_time" else phase)
+        profiler.track_agents(self, lambda: int(self.state_counts().sum()))
+
+    def track_congestion(self, window):
+        # The strips keep maps of their own customers; these cover the ones held here
+        super().track_congestion(window)
+        maps, dispatch = self.congestion, self.dispatch
+
+        def handed_over(rows):
+            maps.lift(self.x[rows], self.y[rows], self.steps)
+            dispatch(rows)
+
+        self.dispatch = handed_over
+
+    def tile_of(self, x):
+        return np.searchsorted(self.bounds, x, side="right") - 1
+
+    def state_counts(self):
+        # Customers held here, in the strips, and crossing between strips
+        counts = super().state_counts() + self.tile_counts.sum(axis=0)
+        for batches in self.incoming:
+            for batch in batches:
+                counts += np.bincount(batch["state"], minlength=GONE + 1)[:GONE]
+        return counts
+
+    def serving_count(self):
+        return len(self.heads[0])  # as the strips reported them at the end of the tick
+
+    def agent_snapshot(self):
+        parts = [super().agent_snapshot()]
+        for pipe in self.pipes:
+            pipe.send(("agents",))
+        parts.extend(pipe.recv() for pipe in self.pipes)
+        for batches in self.incoming:
+            parts.extend((b["uid"], b["state"], b["x"], b["y"]) for b in batches)
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def step(self):
+        super().step()
+        if not self.running:
+            self.close()
+
+    def step_customers(self, hour):
+        state = self.state[:self.size]
+        # Customers turned away last tick start walking to the exit now, as in the vectorized engine
+        leaving = np.flatnonzero(state == EXITING)
+        entering = np.flatnonzero(state == ENTERING)
+        admitted = self.step_entering(entering, hour) if len(entering) else entering
+        handed = np.concatenate([leaving, admitted])
+        handed_cells = np.stack([self.x[handed], self.y[handed]], axis=1)
+        self.dispatch(handed)
+        grants = self.exchange()
+
+        # The halo: customers on the columns next to a strip, and those still held here
+        held = np.flatnonzero(state != GONE)
+        cells = np.stack([self.x[held], self.y[held]], axis=1)
+        edges = np.concatenate(self.edges + [handed_cells])
+        for k, pipe in enumerate(self.pipes):
+            lo, hi = self.bounds[k], self.bounds[k + 1]
+            outside = edges[(edges[:, 0] == lo - 1) | (edges[:, 0] == hi)]
+            near = cells[(cells[:, 0] >= lo - 1) & (cells[:, 0] <= hi)]
+            pipe.send(("step", self.incoming[k], np.concatenate([outside, near]), self.head_ticket, grants[k]))
+        self.incoming = [[] for _ in self.pipes]
+
+        heads, seekers = [], []
+        for k, pipe in enumerate(self.pipes):
+            counts, served, total_wait, freed, emigrants, self.edges[k], tile_heads, tile_seekers = pipe.recv()
+            heads.append(tile_heads)
+            seekers.append(tile_seekers)
+            self.tile_counts[k] = counts
+            self.served += served
+            self.total_wait += total_wait
+            self.seat_free[freed] = True
+            if len(emigrants["state"]):
+                owner = self.tile_of(emigrants["x"])
+                for j in np.unique(owner):
+                    self.incoming[j].append({name: column[owner == j] for name, column in emigrants.items()})
+        self.heads = tuple(np.concatenate(column) for column in zip(*heads))
+        self.seekers = tuple(np.concatenate(column) for column in zip(*seekers))
+
+    def dispatch(self, rows):
+        # Hands customers held here to the strips they stand in
+        if not len(rows):
+            return
+        owner = self.tile_of(self.x[rows])
+        for k in np.unique(owner):
+            moving = rows[owner == k]
+            self.incoming[k].append({name: getattr(self, name)[moving] for name in self.columns})
+        self.state[rows] = GONE
+        self.gone += len(rows)
+
+    def exchange(self):
+        # The counters whose service ends this tick (their timer runs out when the strip
+        # counts it down) go to the door in customer order, then seats are handed out in
+        # customer order, exactly as the single-process engine does on its one floor.
+        # Returns each strip's (uids, seats).
+        uid, counter, timer, x, y = self.heads
+        done = np.flatnonzero(timer <= 1)
+        done = done[np.argsort(uid[done])]
+        for c in counter[done]:
+            self.free_counter(c)
+
+        uids = np.concatenate([self.seekers[0], uid[done]])
+        order = np.argsort(uids)
+        uids = uids[order]
+        xs = np.concatenate([self.seekers[1], x[done]])[order]
+        ys = np.concatenate([self.seekers[2], y[done]])[order]
+        seats = self.allocate_seats(xs, ys)
+        owner = np.where(seats >= 0, self.tile_of(xs), -1)
+        return [(uids[owner == k], seats[owner == k]) for k in range(len(self.pipes))]
+
+    def gather(self):
+        # Lifecycle, queue wait and time to service tallies of all strips, merged; cached
+        # per tick while the strips run and kept once they are closed
+        if self.gathered == self.steps or not self.pipes:
+            return
+        lifecycle, wait_counts, time_to_service_counts = LifecycleKPIs(), Counter(), defaultdict(Counter)
+        for pipe in self.pipes:
+            pipe.send(("stats",))
+        for pipe in self.pipes:
+            tile_lifecycle, tile_waits, tile_counts = pipe.recv()
+            lifecycle.merge(tile_lifecycle)
+            wait_counts.update(tile_waits)
+            for hour, counts in tile_counts.items():
+                time_to_service_counts[hour].update(counts)
+        lifecycle.counts["Arrived"] = self.arrived
+        self.lifecycle, self.wait_counts, self.time_to_service_counts = lifecycle, wait_counts, time_to_service_counts
+        self.gathered = self.steps
+
+    def wait_percentile(self, q):
+        self.gather()
+        return super().wait_percentile(q)
+
+    def latency_percentile(self, name, q):
+        self.gather()
+        return super().latency_percentile(name, q)
+
+    def time_to_service_percentile(self, q, start=None, end=None):
+        self.gather()
+        return super().time_to_service_percentile(q, start, end)
+
+    def close(self):
+        # Called at the end of the day; the merged KPIs and congestion maps stay available afterwards
+        if not self.pipes:
+            return
+        self.gather()
+        for pipe in self.pipes:
+            pipe.send(("close",))
+        maps = [pipe.recv() for pipe in self.pipes]
+        if self.congestion is not None:
+            self.congestion = merge_maps([self.congestion] + maps, self.steps)
+        for pipe in self.pipes:
+            pipe.close()
+        for process in self.processes:
+            process.join()
+        self.pipes, self.processes = [], []
+
+
+class TileEngine(VectorizedCanteenModel):
+    # The customers standing in columns [lo, hi) of the floor. Counters and seats belong to
+    # the ParallelCanteenModel: the tile reports who is at a counter and who is looking
+    # for a seat at the end of each tick, and gets the queue heads and its seats with the
+    # next one. Customers that walk out of the strip are handed back at the end of the tick.
+    def __init__(self, index, lo, hi, **model_params):
+        super().__init__(**model_params)
+        self.lo, self.hi = lo, hi
+        self.routes = self.routes.strip(lo, hi)
+        # Draws made in the strip come from streams of its own
+        self.service_rng = self.streams.generator(f"service/{index}")
+        self.dwell_rng = self.streams.generator(f"dwell/{index}")
+        self.routing_rng = self.streams.generator(f"routing/{index}")
+        self.halo = np.zeros((0, 2), dtype=np.int16)
+        self.freed = []
+        self.served_before, self.total_wait_before = 0, 0
+
+    def track_congestion(self, window):
+        # Customers handed over between strips change maps without passing a cell
+        super().track_congestion(window)
+        maps, add_rows, remove_rows = self.congestion, self.add_rows, self.remove_rows
+
+        def added(batch):
+            add_rows(batch)
+            maps.place(batch["x"], batch["y"], self.steps, passing=False)
+
+        def removed(rows):
+            maps.lift(self.x[rows], self.y[rows], self.steps)
+            return remove_rows(rows)
+
+        self.add_rows, self.remove_rows = added, removed
+
+    def add_rows(self, batch):
+        count = len(batch["state"])
+        self.reserve(count)
+        rows = slice(self.size, self.size + count)
+        for name in self.columns:
+            getattr(self, name)[rows] = batch[name]
+        self.size += count
+
+    def remove_rows(self, rows):
+        batch = {name: getattr(self, name)[rows] for name in self.columns}
+        self.state[rows] = GONE
+        self.gone += len(rows)
+        return batch
+
+    def rows_of(self, uids):
+        live = np.flatnonzero(self.state[:self.size] != GONE)
+        order = live[np.argsort(self.uid[live])]
+        return order[np.searchsorted(self.uid[order], uids)]
+
+    def tick(self, batches, halo, head_ticket, grants):
+        maps = self.congestion
+        if maps is not None:
+            maps.advance(self.steps)
+        for batch in batches:
+            self.add_rows(batch)
+        self.head_ticket = head_ticket
+        uids, seats = grants
+        self.seat[self.rows_of(uids)] = seats
+        self.halo = halo
+        if maps is not None:
+            # Customers just outside the strip count as occupants for blocked moves. Placed
+            # and lifted within the tick, they add no occupancy or passes.
+            maps.place(halo[:, 0], halo[:, 1], self.steps, passing=False)
+        self.step_customers(int(self.current_time))
+        if maps is not None:
+            maps.lift(halo[:, 0], halo[:, 1], self.steps)
+        self.current_time += 1 / 60
+        self.steps += 1
+
+        live = np.flatnonzero(self.state[:self.size] != GONE)
+        ordering = live[self.state[live] == ORDERING]
+        at_counter = ordering[self.counter[ordering] >= 0]
+        seeking = ordering[(self.counter[ordering] < 0) & (self.seat[ordering] < 0)]
+        heads = (self.uid[at_counter], self.counter[at_counter].astype(np.int64), self.timer[at_counter].astype(np.int64),
+                 self.x[at_counter].astype(np.int64), self.y[at_counter].astype(np.int64))
+        seekers = (self.uid[seeking], self.x[seeking].astype(np.int64), self.y[seeking].astype(np.int64))
+        x = self.x[live]
+        edge = live[(x == self.lo - 1) | (x == self.lo) | (x == self.hi - 1) | (x == self.hi)]
+        edges = np.stack([self.x[edge], self.y[edge]], axis=1)
+        emigrants = self.remove_rows(live[(x < self.lo) | (x >= self.hi)])
+        freed = np.array(self.freed, dtype=np.int64)
+        self.freed = []
+        served, total_wait = self.served - self.served_before, self.total_wait - self.total_wait_before
+        self.served_before, self.total_wait_before = self.served, self.total_wait
+        if self.gone > self.size // 2 and self.gone > 1024:
+            self.compact()
+        return self.state_counts(), served, total_wait, freed, emigrants, edges, heads, seekers
+
+    def release_counter(self, i):
+        self.counter[i] = -1  # the ParallelCanteenModel freed the counter at the start of the tick
+
+    def claim_seats(self, rows):
+        pass  # seats came with the tick; the rest wander until one frees up
+
+    def release_seats(self, seats):
+        self.freed.extend(seats.tolist())
+
+    def occupied_cells(self):
+        occupied = super().occupied_cells()
+        occupied[self.halo[:, 0], self.halo[:, 1]] = True
+        return occupied
+
+
+def run_tile(conn, index, lo, hi, model_params):
+    tile = TileEngine(index, lo, hi, **model_params)
+    while True:
+        try:
+            command, *args = conn.recv()
+        except EOFError:
+            return  # the model was dropped without closing
+        if command == "step":
+            conn.send(tile.tick(*args))
+        elif command == "agents":
+            conn.send(tile.agent_snapshot())
+        elif command == "stats":
+            conn.send((tile.lifecycle, tile.wait_counts, tile.time_to_service_counts))
+        elif command == "close":
+            if tile.congestion is not None:
+                tile.congestion.close(tile.steps)
+            conn.send(tile.congestion)
+            return
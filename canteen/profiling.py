@@ -0,0 +1,106 @@
+import csv
+import json
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+
+
+class Profiler:
+    # Opt-in instrumentation. Methods are wrapped on the model's own instances when
+    # profiling is switched on, so a model built without it runs the plain code paths.
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.agents = []  # agents in the model at the start of each tick
+
+    def time(self, owner, attribute, name=None):
+        name = name or attribute
+        method = getattr(owner, attribute)
+        seconds, calls = self.seconds, self.calls
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[name] += perf_counter() - started
+                calls[name] += 1
+
+        setattr(owner, attribute, timed)
+
+    def count(self, owner, attribute, name=None):
+        name = name or attribute
+        method = getattr(owner, attribute)
+        calls = self.calls
+
+        def counted(*args, **kwargs):
+            calls[name] += 1
+            return method(*args, **kwargs)
+
+        setattr(owner, attribute, counted)
+
+    def track_agents(self, model, agent_count):
+        step = model.step
+        agents = self.agents
+
+        def tracked():
+            agents.append(agent_count())
+            step()
+
+        model.step = tracked
+        self.time(model, "step", "tick")
+
+    def to_dict(self):
+        return {"ticks": len(self.agents),
+                "phases": {name: {"calls": self.calls[name], "seconds": self.seconds.get(name, 0.0)}
+                           for name in self.calls},
+                "agents": self.agents}
+
+
+def merge_profiles(profiles):
+    # Sums the phases of several runs, e.g. all replications of a batch
+    merged = {"ticks": 0, "phases": {}, "agents": []}
+    for profile in profiles:
+        merged["ticks"] += profile["ticks"]
+        merged["agents"].extend(profile["agents"])
+        for name, phase in profile["phases"].items():
+            total = merged["phases"].setdefault(name, {"calls": 0, "seconds": 0.0})
+            total["calls"] += phase["calls"]
+            total["seconds"] += phase["seconds"]
+    return merged
+
+
+def profile_rows(profile):
+    rows = []
+    for name, phase in sorted(profile["phases"].items(), key=lambda item: -item[1]["seconds"]):
+        calls, seconds = phase["calls"], phase["seconds"]
+        rows.append({"phase": name, "calls": calls, "seconds": seconds,
+                     "mean_us": seconds / calls * 1e6 if calls else 0.0})
+    return rows
+
+
+def write_profile(profile, path):
+    path = Path(path)
+    if path.suffix == ".json":
+        with open(path, "w") as f:
+            json.dump(profile, f)
+    elif path.suffix == ".csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["phase", "calls", "seconds", "mean_us"])
+            writer.writeheader()
+            writer.writerows(profile_rows(profile))
+    else:
+        raise ValueError(f"Unsupported profile format: {path.suffix} (use .json or .csv)")
+
+
+def format_profile(profile):
+    agents = profile["agents"]
+    lines = [f"  {profile['ticks']} ticks, {sum(agents) / len(agents) if agents else 0:.1f} agents per tick "
+             f"on average, at most {max(agents, default=0)}"]
+    for row in profile_rows(profile):
+        if row["seconds"]:
+            lines.append(f"  {row['phase']:<24}{row['calls']:>10} calls{row['seconds']:>10.3f}s"
+                         f"{row['mean_us']:>10.1f}us/call")
+        else:
+            lines.append(f"  {row['phase']:<24}{row['calls']:>10} calls")
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+from collections import Counter, defaultdict, deque
+import random
+
+QUEUE_DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+
+def percentile_of_counts(counts, q):
+    # q-th percentile (0-100) of a Counter of whole-minute waits, e.g. 95 for the P95 wait
+    total = sum(counts.values())
+    if not total:
+        return 0
+    rank = q / 100 * total
+    seen = 0
+    for wait in sorted(counts):
+        seen += counts[wait]
+        if seen >= rank:
+            return wait
+    return max(counts)
+
+
+def merge_hours(counts_by_hour, hours=None):
+    # hours: indices of the hours to include, all of them by default
+    merged = Counter()
+    for hour, counts in counts_by_hour.items():
+        if hours is None or hour in hours:
+            merged.update(counts)
+    return merged
+
+
+class CashierQueue:
+    def __init__(self, position, slots):
+        self.position = position
+        self.slots = slots  # standing positions, the counter itself first
+        self.customers = deque()
+
+    def __len__(self):
+        return len(self.customers)
+
+
+class CashierQueues:
+    # One bounded FIFO per cashier counter. Counters are kept in buckets by queue
+    # length, so joining the shortest queue (or any open one) never scans counters.
+    def __init__(self, layout, capacity=5, policy="shortest", service_mean=2, service_sd=1, rng=random,
+                 choice_rng=random, wake=None):
+        if policy not in ("shortest", "random"):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.service_mean = service_mean
+        self.service_sd = service_sd
+        self.rng = rng  # service times
+        self.choice_rng = choice_rng  # counter choice under the random policy
+
+        self.counters = [CashierQueue(pos, self.queue_slots(layout, pos, capacity)) for pos in layout.cashier_location]
+        self.by_length = [dict() for _ in range(capacity + 1)]  # insertion-ordered sets of counter indices
+        self.by_length[0].update(dict.fromkeys(range(len(self.counters))))
+        self.open = list(range(len(self.counters)))  # counters with a free slot, for random joins
+        self.open_slot = {i: i for i in self.open}
+        self.waiting = deque()  # customers who arrived while every queue was full
+        self.wake = wake  # called with a door customer when it is handed a slot
+
+        self.joined_at = {}
+        self.served = 0
+        self.total_wait = 0
+        self.wait_counts = Counter()
+        # Minutes from arrival to service, including the walk and the wait at the door,
+        # by the hour of the day (counted from the first tick) the customer arrived in
+        self.time_to_service_counts = defaultdict(Counter)
+
+    @staticmethod
+    def queue_slots(layout, pos, capacity):
+        # The line extends from the counter away from the store, one cell per customer, over
+        # plain floor only, so it never runs onto seats that could be handed to eaters
+        direction = (0, -1)
+        for dx, dy in QUEUE_DIRECTIONS:
+            neighbour = (pos[0] + dx, pos[1] + dy)
+            if layout.is_floor(neighbour) and neighbour not in layout.cashier_location:
+                direction = (dx, dy)
+                break
+        slots = [pos]
+        for _ in range(capacity - 1):
+            nxt = (slots[-1][0] + direction[0], slots[-1][1] + direction[1])
+            slots.append(nxt if layout.is_floor(nxt) else slots[-1])
+        return slots
+
+    def __len__(self):
+        return sum(len(counter) for counter in self.counters)
+
+    def lengths(self):
+        return [len(counter) for counter in self.counters]
+
+    def mean_wait(self):
+        return self.total_wait / self.served if self.served else 0
+
+    def wait_percentile(self, q):
+        return percentile_of_counts(self.wait_counts, q)
+
+    def time_to_service_percentile(self, q, hours=None):
+        return percentile_of_counts(merge_hours(self.time_to_service_counts, hours), q)
+
+    def join(self, customer):
+        index = self.pick_counter()
+        if index is None:
+            self.waiting.append(customer)
+            return None
+        self.admit(customer, index)
+        return index
+
+    def pick_counter(self):
+        if not self.open:
+            return None
+        if self.policy == "random":
+            return self.choice_rng.choice(self.open)
+        for bucket in self.by_length:
+            if bucket:
+                return next(iter(bucket))
+
+    def admit(self, customer, index):
+        counter = self.counters[index]
+        length = len(counter)
+        del self.by_length[length][index]
+        self.by_length[length + 1][index] = None
+        if length + 1 == self.capacity:
+            self.close(index)
+        counter.customers.append(customer)
+        customer.counter = index
+
+    def close(self, index):
+        i = self.open_slot.pop(index)
+        last = self.open.pop()
+        if last != index:
+            self.open[i] = last
+            self.open_slot[last] = i
+
+    def turn_away(self, customer):
+        # Outside opening hours: a slot handed over from the door is given back, and a
+        # customer still waiting at the door leaves the line there
+        if customer.counter is not None:
+            self.leave(customer)
+        elif customer.waiting:
+            self.waiting.remove(customer)
+        customer.waiting = False
+
+    def slot_of(self, customer):
+        counter = self.counters[customer.counter]
+        return counter.slots[counter.customers.index(customer)]
+
+    def is_head(self, customer):
+        return self.counters[customer.counter].customers[0] is customer
+
+    def arrive(self, customer, now):
+        # Waiting time is counted from when the customer first stands in line
+        self.joined_at.setdefault(customer, now)
+
+    def start_service(self, customer, now):
+        wait = now - self.joined_at.pop(customer, now)
+        self.served += 1
+        self.total_wait += wait
+        self.wait_counts[wait] += 1
+        if customer.arrived_at is not None:
+            self.time_to_service_counts[customer.arrived_at // 60][now - customer.arrived_at] += 1
+        if customer.planned_service_time is not None:
+            return customer.planned_service_time
+        return self.draw_service_time()
+
+    def draw_service_time(self):
+        return max(1, round(self.rng.gauss(self.service_mean, self.service_sd)))
+
+    def leave(self, customer):
+        index = customer.counter
+        counter = self.counters[index]
+        counter.customers.remove(customer)
+        customer.counter = None
+        length = len(counter)
+        del self.by_length[length + 1][index]
+        self.by_length[length][index] = None
+        if length + 1 == self.capacity:
+            self.open_slot[index] = len(self.open)
+            self.open.append(index)
+
+        # Hand the freed slot to the longest-waiting customer still at the door
+        while self.waiting:
+            waiting = self.waiting.popleft()
+            if waiting.state == "entering" and waiting.counter is None:
+                self.admit(waiting, index)
+                if self.wake is not None:
+                    self.wake(waiting)
+                break
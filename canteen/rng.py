@@ -0,0 +1,32 @@
+import random
+import zlib
+import numpy as np
+
+# One independent stream per purpose, so changing how often one kind of draw
+# happens (e.g. more cashiers means different routing) never shifts the others
+STREAMS = ("arrivals", "service", "dwell", "seating", "routing", "activation")
+
+
+class RandomStreams:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        for name in STREAMS:
+            setattr(self, name, random.Random(self.stream_seed(name)))
+
+    def stream_seed(self, name):
+        # Keyed by name rather than position, so adding a stream never reseeds the others
+        sequence = np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(name.encode()),))
+        return int(sequence.generate_state(1, np.uint64)[0])
+
+    def generator(self, name):
+        # NumPy generator for the same purpose, for the vectorized engine
+        return np.random.default_rng(self.stream_seed(name))
+
+    def getstate(self):
+        return {name: getattr(self, name).getstate() for name in STREAMS}
+
+    def setstate(self, state):
+        for name, value in state.items():
+            getattr(self, name).setstate(value)
@@ -0,0 +1,237 @@
+import numpy as np
+from .queues import CashierQueues
+
+# Moore neighbourhood, orthogonal moves first so ties prefer straight steps
+DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+# Next hops are stored as one uint8 code per cell, an index into MOVES; 0 stays put
+MOVES = np.array([(0, 0)] + DIRECTIONS, dtype=np.int16)
+MOVE_X, MOVE_Y = MOVES[:, 0].tolist(), MOVES[:, 1].tolist()
+UNREACHABLE = np.iinfo(np.int32).max
+NO_HOP = 255  # window cells the destination cannot be reached from without leaving the window
+EXIT = 0  # destination index of the exit
+QUEUE_LENGTH = 10  # queue slots routed to as one line; slots further out get a field of their own
+CLUSTER_SIZE = 8  # seats are grouped into connected runs within square tiles of this size
+WINDOW_MARGIN = 12  # cells around a class within which customers follow their destination's own field
+
+
+def distance_field(walkable, targets):
+    # Breadth-first search outwards from every target over walkable cells, a whole
+    # frontier at a time. The floor is padded with a closed border so neighbours of the
+    # flattened cells never wrap around.
+    width, height = walkable.shape
+    stride = height + 2
+    open_cells = np.zeros((width + 2, height + 2), dtype=bool)
+    open_cells[1:-1, 1:-1] = walkable
+    open_cells = open_cells.ravel()
+    offsets = np.array([dx * stride + dy for dx, dy in DIRECTIONS])
+    dist = np.full(open_cells.size, UNREACHABLE, dtype=np.int32)
+    targets = np.array([pos for pos in targets if 0 <= pos[0] < width and 0 <= pos[1] < height],
+                       dtype=np.int64).reshape(-1, 2)
+    frontier = np.unique((targets[:, 0] + 1) * stride + targets[:, 1] + 1)
+    frontier = frontier[open_cells[frontier]]
+    d = 0
+    while len(frontier):
+        dist[frontier] = d
+        d += 1
+        reached = (frontier[:, None] + offsets).ravel()
+        frontier = np.unique(reached[open_cells[reached] & (dist[reached] == UNREACHABLE)])
+    return dist.reshape(width + 2, height + 2)[1:-1, 1:-1].copy()
+
+
+def next_hops(dist):
+    # For every cell, the move towards its closest neighbour (0 when none is closer)
+    width, height = dist.shape
+    padded = np.full((width + 2, height + 2), UNREACHABLE, dtype=np.int32)
+    padded[1:-1, 1:-1] = dist
+    candidates = np.stack([dist] + [padded[1 + dx:1 + dx + width, 1 + dy:1 + dy + height] for dx, dy in DIRECTIONS])
+    return np.argmin(candidates, axis=0).astype(np.uint8)
+
+
+def seat_clusters(seats):
+    # Seats that touch each other, split along a grid of CLUSTER_SIZE tiles so no cluster
+    # spans more than one tile however the seats are laid out
+    remaining = dict.fromkeys(seats)
+    clusters = []
+    for seat in list(remaining):
+        if seat not in remaining:
+            continue
+        tile = (seat[0] // CLUSTER_SIZE, seat[1] // CLUSTER_SIZE)
+        del remaining[seat]
+        cluster, stack = [], [seat]
+        while stack:
+            x, y = stack.pop()
+            cluster.append((x, y))
+            for dx, dy in DIRECTIONS:
+                neighbour = (x + dx, y + dy)
+                if neighbour in remaining and (neighbour[0] // CLUSTER_SIZE, neighbour[1] // CLUSTER_SIZE) == tile:
+                    del remaining[neighbour]
+                    stack.append(neighbour)
+        clusters.append(sorted(cluster))
+    return clusters
+
+
+def compile_routes(layout):
+    # One field per class of destinations: the exit, each counter's line of QUEUE_LENGTH
+    # slots and each seat cluster. It leads to the nearest cell of the class, and a field
+    # over the class's bounding box (plus WINDOW_MARGIN cells) per destination leads on from
+    # there, so the work grows with classes x floor area, not destinations x floor area.
+    walkable = layout.walkable
+    lines = [list(dict.fromkeys(CashierQueues.queue_slots(layout, pos, QUEUE_LENGTH)))
+             for pos in dict.fromkeys(layout.cashier_location)]
+    classes = [list(layout.exit_location)] + lines + seat_clusters(layout.dining_areas)
+    hops = np.stack([next_hops(distance_field(walkable, targets)) for targets in classes])
+
+    cells, owners, windows, offsets, local = [(-1, -1)], [EXIT], [(0, 0, 0, 0)], [0], []
+    size = 0
+    seen = set()
+    for k, targets in enumerate(classes[1:], 1):
+        xs, ys = zip(*targets)
+        x0, y0 = max(min(xs) - WINDOW_MARGIN, 0), max(min(ys) - WINDOW_MARGIN, 0)
+        x1, y1 = min(max(xs) + WINDOW_MARGIN + 1, layout.width), min(max(ys) + WINDOW_MARGIN + 1, layout.height)
+        window = walkable[x0:x1, y0:y1]
+        for x, y in targets:
+            if (x, y) in seen:  # lines can cross; the first class through a cell routes to it
+                continue
+            seen.add((x, y))
+            dist = distance_field(window, [(x - x0, y - y0)])
+            codes = np.where(dist == UNREACHABLE, NO_HOP, next_hops(dist)).astype(np.uint8)
+            cells.append((x, y))
+            owners.append(k)
+            windows.append((x0, y0, x1 - x0, y1 - y0))
+            offsets.append(size)
+            local.append(codes.ravel())
+            size += codes.size
+    return RouteTables(hops=hops, cells=np.array(cells, dtype=np.int32), classes=np.array(owners, dtype=np.int32),
+                       windows=np.array(windows, dtype=np.int32), offsets=np.array(offsets, dtype=np.int64),
+                       local=np.concatenate(local) if local else np.zeros(0, dtype=np.uint8))
+
+
+class RouteTables:
+    # The compiled routes of one floor as flat arrays, indexed by destination: its cell,
+    # class and window, and where its window's codes start in `local`. The class fields
+    # may cover only the columns from `origin` on, see strip(). The compiled arrays are
+    # never written to, so copies and strips share them.
+    def __init__(self, hops, cells, classes, windows, offsets, local, origin=0):
+        self.hops = hops
+        self.origin = origin
+        self.cells = cells
+        self.classes = classes
+        self.windows = windows
+        self.offsets = offsets
+        self.local = local
+        self.compiled = len(cells)
+        self.index = {tuple(cell): i for i, cell in enumerate(cells.tolist()) if i != EXIT}
+        # Plain Python copies for the Mesa engine, which routes one customer at a time
+        self.entries = list(zip(classes.tolist(), windows.tolist(), offsets.tolist()))
+        # Fields of the destinations added after compiling, numbered on from `compiled`;
+        # rows past `added_count` are spare, and the buffer is copied before writing to it
+        # unless these tables own it
+        self.added = np.zeros((0,) + hops.shape[1:], dtype=np.uint8)
+        self.added_count = 0
+        self.owns_added = True
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in ("hops", "cells", "classes", "windows", "offsets", "local")}
+
+    def strip(self, lo, hi):
+        # Routes for customers standing in columns [lo, hi) only, e.g. a strip of
+        # canteen.parallel: a view of those columns of every field, so a memory-mapped
+        # field is only read there
+        strip = RouteTables(self.hops[:, lo:hi], self.cells, self.classes, self.windows, self.offsets, self.local,
+                            origin=self.origin + lo)
+        strip.index = dict(self.index)
+        strip.added = self.added[:self.added_count, lo:hi]
+        strip.added_count = self.added_count
+        strip.owns_added = False
+        return strip
+
+    def copy(self):
+        # The same routes, sharing every array; destinations added to either from now on
+        # are its own, e.g. for a subset_layout
+        return self.strip(0, self.hops.shape[1])
+
+    def destination(self, walkable, cell):
+        i = self.index.get(cell)
+        if i is None:
+            i = self.add(walkable, cell)
+        return i
+
+    def add(self, walkable, cell):
+        # A destination outside the compiled classes, e.g. a slot of a queue longer than
+        # QUEUE_LENGTH, gets a field of its own; solved and kept in memory on first use.
+        # The buffer grows in chunks, so adding many costs a copy only now and then.
+        field = next_hops(distance_field(walkable, [cell]))[self.origin:self.origin + self.hops.shape[1]]
+        if not self.owns_added or self.added_count == len(self.added):
+            grown = np.zeros((max(2 * self.added_count, 8),) + self.added.shape[1:], dtype=np.uint8)
+            grown[:self.added_count] = self.added[:self.added_count]
+            self.added, self.owns_added = grown, True
+        self.added[self.added_count] = field
+        i = self.compiled + self.added_count
+        self.added_count += 1
+        self.index[tuple(cell)] = i
+        return i
+
+    def hop(self, destination, x, y):
+        # Next cell from (x, y) towards one destination
+        if destination >= self.compiled:
+            code = self.added[destination - self.compiled, x - self.origin, y]
+            return x + MOVE_X[code], y + MOVE_Y[code]
+        k, (x0, y0, w, h), offset = self.entries[destination]
+        lx, ly = x - x0, y - y0
+        if 0 <= lx < w and 0 <= ly < h:
+            code = self.local[offset + lx * h + ly]
+            if code != NO_HOP:
+                return x + MOVE_X[code], y + MOVE_Y[code]
+        code = self.hops[k, x - self.origin, y]
+        return x + MOVE_X[code], y + MOVE_Y[code]
+
+    def step(self, destinations, xs, ys):
+        # Next cells of many customers at once, each towards its own destination
+        added = destinations >= self.compiled if self.added_count else None
+        if added is not None and added.any():
+            codes = np.empty(len(destinations), dtype=np.uint8)
+            codes[added] = self.added[destinations[added] - self.compiled, xs[added] - self.origin, ys[added]]
+            compiled = ~added
+            codes[compiled] = self.codes(destinations[compiled], xs[compiled], ys[compiled])
+        else:
+            codes = self.codes(destinations, xs, ys)
+        return xs + MOVES[codes, 0], ys + MOVES[codes, 1]
+
+    def codes(self, destinations, xs, ys):
+        # Move codes towards compiled destinations: the destination's own window field
+        # where it leads there, else its class field
+        codes = self.hops[self.classes[destinations], xs - self.origin, ys]
+        x0, y0, w, h = self.windows[destinations].T
+        lx, ly = xs - x0, ys - y0
+        inside = np.flatnonzero((lx >= 0) & (lx < w) & (ly >= 0) & (ly < h))
+        if len(inside):
+            local = self.local[self.offsets[destinations[inside]] + lx[inside] * h[inside] + ly[inside]]
+            reachable = local != NO_HOP
+            codes[inside[reachable]] = local[reachable]
+        return codes
+
+
+class FlowFields:
+    # Routes of one layout, compiled on first use unless the layout cache already holds
+    # them (see canteen.layout.cached_layout). The tables are shared by every copy of this
+    # object, so a destination added through one is known to all.
+    def __init__(self, layout):
+        self.layout = layout
+        self.tables = None
+
+    def compiled(self):
+        if self.tables is None:
+            self.tables = compile_routes(self.layout)
+        return self.tables
+
+    def destinations(self, cells):
+        tables = self.compiled()
+        return np.array([tables.destination(self.layout.walkable, tuple(cell)) for cell in cells],
+                        dtype=np.int32)
+
+    def step_towards(self, pos, destination):
+        tables = self.tables or self.compiled()
+        return tables.hop(tables.destination(self.layout.walkable, destination), pos[0], pos[1])
+
+    def step_to_exit(self, pos):
+        return (self.tables or self.compiled()).hop(EXIT, pos[0], pos[1])
@@ -0,0 +1,58 @@
+import heapq
+from mesa.agent import AgentSet
+from mesa.time import RandomActivation
+
+
+class HybridActivation(RandomActivation):
+    # Random activation for agents that act every tick, plus a wake-up heap for agents
+    # doing something of known length (being served, eating). Parked agents are not
+    # stepped at all until their wake-up tick, when they rejoin the active set. Agents
+    # waiting for something else (a slot in a queue) are parked until woken up.
+    def __init__(self, model, agents=None):
+        super().__init__(model, agents)
+        self.active = AgentSet(self._agents, model)
+        self.wakeups = []
+        self.parked = {}
+        self.sequence = 0
+
+    def add(self, agent):
+        super().add(agent)
+        self.active.add(agent)
+
+    def remove(self, agent):
+        super().remove(agent)
+        self.active.discard(agent)
+        self.parked.pop(agent, None)
+
+    def park(self, agent, ticks=None):
+        # The agent's next step happens `ticks` steps from now, or after wake() without ticks
+        self.active.discard(agent)
+        if ticks is None:
+            self.parked[agent] = None
+            return
+        wake_step = self.steps + ticks
+        self.parked[agent] = wake_step
+        self.sequence += 1
+        heapq.heappush(self.wakeups, (wake_step, self.sequence, agent))
+
+    def wake(self, agent):
+        # Stepped again from the next step on
+        self.parked.pop(agent, None)
+        self.active.add(agent)
+
+    def wake_due(self):
+        while self.wakeups and self.wakeups[0][0] <= self.steps:
+            wake_step, _, agent = heapq.heappop(self.wakeups)
+            if self.parked.get(agent) == wake_step:  # skip entries for removed or re-parked agents
+                del self.parked[agent]
+                self.active.add(agent)
+
+    def step(self):
+        self.wake_due()
+        agents = list(self.active)
+        self.model.random.shuffle(agents)
+        for agent in agents:
+            if agent in self.active:
+                agent.step()
+        self.steps += 1
+        self.time += 1
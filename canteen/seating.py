@@ -0,0 +1,80 @@
+import random
+
+
+class SeatIndex:
+    # Free seats bucketed into square tiles of the floor plan, so a nearest-seat
+    # query only looks at the tiles around the customer instead of every seat
+    def __init__(self, seats, bucket_size=4):
+        self.bucket_size = bucket_size
+        self.seats = list(seats)
+        self.buckets = {}
+        for seat in self.seats:
+            self.buckets.setdefault(self.bucket_of(seat), set()).add(seat)
+        bucket_xs = [bx for bx, by in self.buckets] or [0]
+        bucket_ys = [by for bx, by in self.buckets] or [0]
+        self.bucket_bounds = (min(bucket_xs), max(bucket_xs), min(bucket_ys), max(bucket_ys))
+
+        # Flat list plus position lookup gives O(1) add, remove and random choice
+        self.free = list(dict.fromkeys(self.seats))
+        self.free_slot = {seat: i for i, seat in enumerate(self.free)}
+
+    def bucket_of(self, pos):
+        return pos[0] // self.bucket_size, pos[1] // self.bucket_size
+
+    def __len__(self):
+        return len(self.free)
+
+    def is_free(self, seat):
+        return seat in self.free_slot
+
+    def occupy(self, seat):
+        i = self.free_slot.pop(seat, None)
+        if i is None:
+            return
+        last = self.free.pop()
+        if last != seat:
+            self.free[i] = last
+            self.free_slot[last] = i
+        self.buckets[self.bucket_of(seat)].discard(seat)
+
+    def release(self, seat):
+        if seat in self.free_slot or self.bucket_of(seat) not in self.buckets:
+            return
+        self.free_slot[seat] = len(self.free)
+        self.free.append(seat)
+        self.buckets[self.bucket_of(seat)].add(seat)
+
+    def any_free(self, rng=random):
+        if not self.free:
+            return None
+        return rng.choice(self.free)
+
+    def nearest_free(self, pos):
+        if not self.free:
+            return None
+        size = self.bucket_size
+        cx, cy = self.bucket_of(pos)
+        min_x, max_x, min_y, max_y = self.bucket_bounds
+        max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        best, best_distance = None, None
+        for ring in range(max_ring + 1):
+            # Every cell of a tile `ring` tiles away is at least this far from pos
+            if best is not None and best_distance < (ring - 1) * size + 1:
+                break
+            for bucket in self.ring(cx, cy, ring):
+                for seat in self.buckets.get(bucket, ()):
+                    distance = abs(seat[0] - pos[0]) + abs(seat[1] - pos[1])
+                    if best is None or distance < best_distance or (distance == best_distance and seat < best):
+                        best, best_distance = seat, distance
+        return best
+
+    def ring(self, cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for bx in range(cx - ring, cx + ring + 1):
+            yield bx, cy - ring
+            yield bx, cy + ring
+        for by in range(cy - ring + 1, cy + ring):
+            yield cx - ring, by
+            yield cx + ring, by
@@ -1,22 +1,42 @@
-from mesa.visualization.modules import CanvasGrid, ChartModule
 from mesa.visualization.ModularVisualization import ModularServer
+from .layout import load_layout
 from .model import CanteenModel
-from .visualization import customer_portrayal
+from .visualization import BatchedChartModule, DeltaCanvasGrid, LatencyTable
 
-def run_server():
-    width, height = 44, 24
-    grid = CanvasGrid(customer_portrayal, width, height, width * 20, height * 20)
+def build_elements(layout, latencies=True, heatmap="Occupancy"):
+    width, height = layout.width, layout.height
+    grid = DeltaCanvasGrid(width, height, width * 20, height * 20, heatmap=heatmap)
 
-    chart = ChartModule([{"Label": "Entering", "Color": "green"},
-                         {"Label": "Queuing", "Color": "yellow"},
-                         {"Label": "Ordering", "Color": "blue"},
-                         {"Label": "Eating", "Color": "red"}],
-                        data_collector_name='datacollector')
+    chart = BatchedChartModule([{"Label": "Entering", "Color": "green"},
+                                {"Label": "Queuing", "Color": "yellow"},
+                                {"Label": "Ordering", "Color": "blue"},
+                                {"Label": "Eating", "Color": "red"}])
+    return [grid, chart, LatencyTable()] if latencies else [grid, chart]
 
+def run_server():
+    layout = load_layout()
     server = ModularServer(CanteenModel,
-                           [grid, chart],
+                           build_elements(layout),
                            "SGLC Canteen Model Simulation",
-                           {"width": width, "height": height})
+                           {"width": layout.width, "height": layout.height, "verbose": True,
+                            "congestion": True})
 
     server.port = 8521
-    server.launch()
\ No newline at end of file
+    server.launch()
+
+def run_live_server(port=8521, fps=10):
+    # The model runs headless at its own pace; the browser only watches and steers it
+    from .live import LiveServer
+    layout = load_layout()
+    server = LiveServer(build_elements(layout), model_params={"width": layout.width, "height": layout.height,
+                                                                 "congestion": True},
+                        fps=fps)
+    server.launch(port)
+
+def run_replay_server(path, port=8521, fps=10):
+    # Plays back a day recorded with record_to; nothing is simulated, and latencies are not recorded
+    from .live import LiveServer
+    from .trajectory import Trajectory
+    elements = build_elements(Trajectory(path), latencies=False, heatmap=None)
+    server = LiveServer(elements, "SGLC Canteen Replay", fps=fps, replay=path)
+    server.launch(port)
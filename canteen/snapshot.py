@@ -0,0 +1,149 @@
+import copy
+import pickle
+import numpy as np
+from .arrivals import ArrivalProfile
+from .model import CanteenModel
+
+CUSTOMER_FIELDS = ("unique_id", "pos", "state", "service_time", "counter", "waiting", "seat",
+                   "planned_service_time", "dwell_time", "arrived_at", "queued_at", "served_at", "seated_at", "left_at")
+
+
+def run_until(model, hour):
+    while model.running and model.current_time < hour:
+        model.step()
+    return model
+
+
+def take_snapshot(model):
+    # Plain, picklable checkpoint of a CanteenModel: clock, RNG states, arrival cursor,
+    # every customer, the queues and the scheduler's wake-up heap. Collected data is not
+    # part of it; a restored model starts collecting from the snapshot tick.
+    schedule = model.schedule
+    queues = model.queues
+    return {"layout": model.layout,  # a map file layout pickles as its path
+            "seed": model.streams.seed,
+            "common_random_numbers": model.common_random_numbers,
+            "queue_capacity": queues.capacity,
+            "queue_policy": queues.policy,
+            "current_time": model.current_time,
+            "steps": schedule.steps,
+            "time": schedule.time,
+            "current_id": model.current_id,
+            "running": model.running,
+            "streams": model.streams.getstate(),
+            "arrival_times": model.arrival_times.copy(),
+            "arrival_cursor": model.arrival_cursor,
+            "lifecycle": copy.deepcopy(model.lifecycle),
+            "congestion": copy.deepcopy(model.congestion),
+            "customers": [tuple(getattr(c, name) for name in CUSTOMER_FIELDS) for c in schedule._agents],
+            "active": [c.unique_id for c in schedule.active],
+            "wakeups": [(wake_step, sequence, agent.unique_id) for wake_step, sequence, agent in schedule.wakeups
+                        if schedule.parked.get(agent) == wake_step],
+            "sequence": schedule.sequence,
+            "free_seats": list(model.seats.free),
+            "queue_members": [[c.unique_id for c in counter.customers] for counter in queues.counters],
+            "queue_buckets": [list(bucket) for bucket in queues.by_length],
+            "queue_open": list(queues.open),
+            "queue_waiting": [c.unique_id for c in queues.waiting],
+            "queue_joined_at": {c.unique_id: tick for c, tick in queues.joined_at.items()},
+            "queue_served": queues.served,
+            "queue_total_wait": queues.total_wait,
+            "queue_wait_counts": dict(queues.wait_counts),
+            "queue_time_to_service_counts": {hour: dict(counts) for hour, counts in
+                                             queues.time_to_service_counts.items()}}
+
+
+def restore_snapshot(snapshot, seed=None, queue_policy=None, queue_capacity=None, arrival_profile=None,
+                     **model_params):
+    # Rebuilds a model that continues exactly where the snapshot was taken. Variants can
+    # override the seed (fresh random streams from here on), the queue policy or capacity,
+    # and the arrival profile for the rest of the day.
+    capacity = queue_capacity if queue_capacity is not None else snapshot["queue_capacity"]
+    longest = max((len(members) for members in snapshot["queue_members"]), default=0)
+    if capacity < longest:
+        raise ValueError(f"Queue capacity {capacity} is shorter than a queue in the snapshot ({longest})")
+
+    model = CanteenModel(layout=snapshot["layout"],
+                         queue_capacity=capacity,
+                         queue_policy=queue_policy or snapshot["queue_policy"],
+                         seed=snapshot["seed"] if seed is None else seed,
+                         common_random_numbers=snapshot["common_random_numbers"],
+                         arrival_times=snapshot["arrival_times"],
+                         **model_params)
+    if seed is None:
+        model.streams.setstate(snapshot["streams"])
+    model.current_time = snapshot["current_time"]
+    model.current_id = snapshot["current_id"]
+    model.running = snapshot["running"]
+    model.arrival_cursor = snapshot["arrival_cursor"]
+    if arrival_profile is not None:
+        if not isinstance(arrival_profile, ArrivalProfile):
+            arrival_profile = ArrivalProfile(arrival_profile)
+        released = model.arrival_times[:model.arrival_cursor]
+        remaining = arrival_profile.generate(model.streams.generator("arrival_times"),
+                                             model.current_time, model.end_time)
+        model.arrival_times = np.concatenate([released, remaining])
+
+    model.lifecycle = copy.deepcopy(snapshot["lifecycle"])  # every fork gets its own sketches
+    schedule = model.schedule
+    schedule.steps = snapshot["steps"]
+    schedule.time = snapshot["time"]
+    customers = {}
+    for values in snapshot["customers"]:
+        fields = dict(zip(CUSTOMER_FIELDS, values))
+        customer = model.restore_customer(fields)
+        customers[customer.unique_id] = customer
+    if model.congestion is not None and snapshot.get("congestion") is not None:
+        # Placing the customers above counted them as arrivals; the snapshot's maps did not
+        model.congestion = copy.deepcopy(snapshot["congestion"])
+
+    # Same activation order and wake-up heap as the original
+    for customer in customers.values():
+        schedule.active.discard(customer)
+    for unique_id in snapshot["active"]:
+        schedule.active.add(customers[unique_id])
+    for wake_step, sequence, unique_id in snapshot["wakeups"]:
+        schedule.wakeups.append((wake_step, sequence, customers[unique_id]))
+        schedule.parked[customers[unique_id]] = wake_step
+    schedule.wakeups.sort(key=lambda entry: entry[:2])
+    schedule.sequence = snapshot["sequence"]
+
+    # Free seats in their original order, since random seat choice indexes into it
+    seats = model.seats
+    free = set(snapshot["free_seats"])
+    for seat in seats.seats:
+        if seat not in free:
+            seats.occupy(seat)
+    seats.free = list(snapshot["free_seats"])
+    seats.free_slot = {seat: i for i, seat in enumerate(seats.free)}
+
+    queues = model.queues
+    for counter, members in zip(queues.counters, snapshot["queue_members"]):
+        counter.customers.extend(customers[unique_id] for unique_id in members)
+    if capacity == snapshot["queue_capacity"]:
+        queues.by_length = [dict.fromkeys(bucket) for bucket in snapshot["queue_buckets"]]
+        queues.open = list(snapshot["queue_open"])
+    else:
+        queues.by_length = [dict() for _ in range(capacity + 1)]
+        for index, counter in enumerate(queues.counters):
+            queues.by_length[len(counter)][index] = None
+        queues.open = [index for index, counter in enumerate(queues.counters) if len(counter) < capacity]
+    queues.open_slot = {index: i for i, index in enumerate(queues.open)}
+    queues.waiting.extend(customers[unique_id] for unique_id in snapshot["queue_waiting"] if unique_id in customers)
+    queues.joined_at = {customers[unique_id]: tick for unique_id, tick in snapshot["queue_joined_at"].items()}
+    queues.served = snapshot["queue_served"]
+    queues.total_wait = snapshot["queue_total_wait"]
+    queues.wait_counts.update(snapshot["queue_wait_counts"])
+    for hour, counts in snapshot["queue_time_to_service_counts"].items():
+        queues.time_to_service_counts[hour].update(counts)
+    return model
+
+
+def save_snapshot(snapshot, path):
+    with open(path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,46 @@
+// Line chart that appends the rows it is sent and redraws at most once per animation
+// frame, without Chart.js animations, however fast the model steps
+const BatchedChartModule = function (series, canvas_width, canvas_height) {
+  const canvas = document.createElement("canvas");
+  Object.assign(canvas, { width: canvas_width, height: canvas_height, style: "border:1px dotted" });
+  document.getElementById("elements").appendChild(canvas);
+
+  const chart = new Chart(canvas.getContext("2d"), {
+    type: "line",
+    data: {
+      labels: [],
+      datasets: series.map((s) => ({ label: s.Label, borderColor: s.Color, backgroundColor: s.Color, data: [],
+                                     pointRadius: 0, borderWidth: 1.5 })),
+    },
+    options: {
+      responsive: true,
+      animation: false,
+      normalized: true,
+      scales: { x: { ticks: { maxTicksLimit: 11 } } },
+    },
+  });
+
+  let pending = false;
+  const update = () => {
+    pending = false;
+    chart.update("none");
+  };
+
+  // data is a list of [label, value, value, ...] rows not sent before
+  this.render = (data) => {
+    for (const row of data) {
+      chart.data.labels.push(row[0]);
+      for (let i = 1; i < row.length; i++) chart.data.datasets[i - 1].data.push(row[i]);
+    }
+    if (data.length && !pending) {
+      pending = true;
+      requestAnimationFrame(update);
+    }
+  };
+
+  this.reset = () => {
+    chart.data.labels.length = 0;
+    chart.data.datasets.forEach((dataset) => (dataset.data.length = 0));
+    chart.update("none");
+  };
+};
@@ -0,0 +1,85 @@
+// Grid view that receives the static floor plan once and afterwards only the customers
+// that moved, changed state or left. Customers are flat [id, x, y, state, ...] arrays,
+// congestion heat the cells whose shade changed as [x, y, level, ...].
+const DeltaCanvasModule = function (canvas_width, canvas_height, grid_width, grid_height, state_colors, heat_levels) {
+  const parent = document.createElement("div");
+  Object.assign(parent, { style: `height:${canvas_height}px;`, className: "world-grid-parent" });
+  const createCanvas = () => {
+    const el = document.createElement("canvas");
+    Object.assign(el, { width: canvas_width, height: canvas_height, className: "world-grid" });
+    parent.appendChild(el);
+    return el.getContext("2d");
+  };
+  const floor = createCanvas(); // drawn once per model
+  const heat = createCanvas(); // congestion shades, updated cell by cell
+  const people = createCanvas(); // redrawn from the client-side copy of every customer
+  document.getElementById("elements").appendChild(parent);
+
+  const cellWidth = Math.floor(canvas_width / grid_width);
+  const cellHeight = Math.floor(canvas_height / grid_height);
+  const radius = Math.min(cellWidth, cellHeight) / 2 - 1;
+  // Grid y grows upwards, canvas y downwards
+  const top = (y) => (grid_height - y - 1) * cellHeight;
+  const customers = new Map();
+
+  const drawFloor = (cells, colors) => {
+    floor.clearRect(0, 0, canvas_width, canvas_height);
+    for (let i = 0; i < cells.length; i += 3) {
+      floor.fillStyle = colors[cells[i + 2]];
+      floor.fillRect(cells[i] * cellWidth, top(cells[i + 1]), cellWidth, cellHeight);
+    }
+    floor.strokeStyle = "#eee";
+    floor.beginPath();
+    for (let x = 0; x <= grid_width * cellWidth; x += cellWidth) {
+      floor.moveTo(x + 0.5, 0);
+      floor.lineTo(x + 0.5, grid_height * cellHeight);
+    }
+    for (let y = 0; y <= grid_height * cellHeight; y += cellHeight) {
+      floor.moveTo(0, y + 0.5);
+      floor.lineTo(grid_width * cellWidth, y + 0.5);
+    }
+    floor.stroke();
+  };
+
+  const drawHeat = (cells) => {
+    for (let i = 0; i < cells.length; i += 3) {
+      const left = cells[i] * cellWidth;
+      heat.clearRect(left, top(cells[i + 1]), cellWidth, cellHeight);
+      if (cells[i + 2] > 0) {
+        heat.fillStyle = `rgba(255, 0, 0, ${(0.6 * cells[i + 2]) / (heat_levels - 1)})`;
+        heat.fillRect(left, top(cells[i + 1]), cellWidth, cellHeight);
+      }
+    }
+  };
+
+  const drawCustomers = () => {
+    people.clearRect(0, 0, canvas_width, canvas_height);
+    for (const [x, y, state] of customers.values()) {
+      people.fillStyle = state_colors[state];
+      people.beginPath();
+      people.arc((x + 0.5) * cellWidth, top(y) + cellHeight / 2, radius, 0, 2 * Math.PI);
+      people.fill();
+    }
+  };
+
+  this.render = (data) => {
+    if (data.floor) {
+      customers.clear();
+      heat.clearRect(0, 0, canvas_width, canvas_height);
+      drawFloor(data.floor, data.colors);
+    }
+    if (data.heat) drawHeat(data.heat);
+    const changed = data.changed;
+    for (let i = 0; i < changed.length; i += 4) {
+      customers.set(changed[i], [changed[i + 1], changed[i + 2], changed[i + 3]]);
+    }
+    for (const id of data.gone) customers.delete(id);
+    drawCustomers();
+  };
+
+  this.reset = () => {
+    customers.clear();
+    heat.clearRect(0, 0, canvas_width, canvas_height);
+    people.clearRect(0, 0, canvas_width, canvas_height);
+  };
+};
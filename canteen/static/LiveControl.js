@@ -0,0 +1,61 @@
+// Controls for canteen.live.LiveServer. The server pushes frames on its own schedule;
+// this page renders whatever arrives last and sends play, pause, step, speed, seek and
+// reset commands back.
+const elements = [];
+
+const playButton = document.getElementById("play-pause");
+const stepButton = document.getElementById("step");
+const resetButton = document.getElementById("reset");
+const speedSelect = document.getElementById("speed");
+const seekSlider = document.getElementById("seek");
+const clock = document.getElementById("clock");
+const tick = document.getElementById("tick");
+
+let ws = null;
+let paused = true;
+let seeking = false; // the slider follows the model unless the user is dragging it
+
+const send = (type, value) => ws && ws.readyState === WebSocket.OPEN && ws.send(JSON.stringify({ type, value }));
+
+playButton.onclick = () => send(paused ? "play" : "pause");
+stepButton.onclick = () => send("step");
+resetButton.onclick = () => send("reset");
+speedSelect.onchange = () => send("speed", Number(speedSelect.value));
+seekSlider.oninput = () => (seeking = true);
+seekSlider.onchange = () => {
+  seeking = false;
+  send("seek", Number(seekSlider.value));
+};
+
+// Only the latest frame is drawn, once per animation frame
+let latest = null;
+const draw = () => {
+  const frame = latest;
+  latest = null;
+  elements.forEach((element, index) => element.render(frame.data[index]));
+  paused = frame.paused || !frame.running;
+  playButton.firstElementChild.innerText = !frame.running ? "Done" : frame.paused ? "Play" : "Pause";
+  clock.innerText = frame.time;
+  tick.innerText = frame.step;
+  seekSlider.max = frame.end;
+  if (!seeking) seekSlider.value = frame.step;
+};
+
+// Connect once the element scripts below have registered themselves
+window.addEventListener("load", () => {
+  ws = new WebSocket((window.location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
+  ws.onopen = () => send("speed", Number(speedSelect.value));
+  ws.onmessage = (message) => {
+    const msg = JSON.parse(message.data);
+    if (msg.type === "reset") {
+      // A reset or a seek back: start the views over
+      latest = null;
+      elements.forEach((element) => element.reset());
+    } else if (msg.type === "frame") {
+      // Chart rows arrive once per frame, so a skipped frame keeps its rows
+      if (latest) elements.forEach((element, index) => element.render(latest.data[index]));
+      if (!latest) requestAnimationFrame(draw);
+      latest = msg;
+    }
+  };
+});
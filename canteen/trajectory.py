@@ -0,0 +1,109 @@
+import json
+from pathlib import Path
+import numpy as np
+from .collector import STATES
+
+# One packed 9-byte record per customer per tick; states are indices into STATES
+RECORD_DTYPE = np.dtype([("id", "<i4"), ("x", "<i2"), ("y", "<i2"), ("state", "u1")])
+
+
+class TrajectoryRecorder:
+    # Writes every customer's position and state at every tick to `directory`:
+    # records.bin holds the records tick after tick and ticks.bin the offset of each tick's
+    # first record, so any tick is one slice of a memory map. Ticks are buffered and
+    # appended `chunk_ticks` at a time; the floor plan and meta.json, with the record
+    # count that ends the last tick, are written on close.
+    def __init__(self, directory, chunk_ticks=240):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_ticks = chunk_ticks
+        self.frames = []
+        self.offsets = []
+        self.records = 0
+        self.ticks = 0
+        for name in ("records.bin", "ticks.bin"):
+            (self.directory / name).write_bytes(b"")
+
+    def record(self, model):
+        ids, states, xs, ys = model.agent_snapshot()
+        frame = np.empty(len(ids), dtype=RECORD_DTYPE)
+        frame["id"], frame["x"], frame["y"], frame["state"] = ids, xs, ys, states
+        self.frames.append(frame)
+        self.offsets.append(self.records)
+        self.records += len(frame)
+        self.ticks += 1
+        if len(self.frames) >= self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        with open(self.directory / "records.bin", "ab") as f:
+            for frame in self.frames:
+                f.write(frame.tobytes())
+        with open(self.directory / "ticks.bin", "ab") as f:
+            f.write(np.array(self.offsets, dtype="<i8").tobytes())
+        self.frames, self.offsets = [], []
+
+    def close(self, model):
+        # Records the final state too, so a replay ends where the day did
+        self.record(model)
+        self.flush()
+        np.save(self.directory / "cells.npy", model.layout.cells)
+        meta = {"ticks": self.ticks, "records": self.records, "start_time": model.start_time,
+                "width": model.layout.width, "height": model.layout.height, "states": STATES}
+        (self.directory / "meta.json").write_text(json.dumps(meta))
+
+
+class Trajectory:
+    # A recorded day, memory-mapped: frame(step) reads one tick without touching the rest
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / "meta.json").read_text())
+        if tuple(meta["states"]) != STATES:
+            raise ValueError(f"Recorded with states {meta['states']}, not {list(STATES)}")
+        self.start_time = meta["start_time"]
+        self.width, self.height = meta["width"], meta["height"]
+        self.cells = np.load(self.directory / "cells.npy")
+        self.offsets = np.append(np.fromfile(self.directory / "ticks.bin", dtype="<i8"), meta["records"])
+        if meta["records"]:
+            self.records = np.memmap(self.directory / "records.bin", dtype=RECORD_DTYPE, mode="r")
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def frame(self, step):
+        return self.records[self.offsets[step]:self.offsets[step + 1]]
+
+
+class ReplayModel:
+    # A recorded day played back through the read-only interface the visualization
+    # elements and the live dashboard's runner use, so seeking costs one frame read
+    def __init__(self, trajectory, step=0):
+        self.trajectory = trajectory
+        self.layout = trajectory  # the elements only need its cells, width and height
+        self.schedule = self  # the runner reads schedule.steps, as on a Mesa model
+        self.start_time = trajectory.start_time
+        self.end_time = self.start_time + (len(trajectory) - 1) / 60
+        self.seek(step)
+
+    def seek(self, step):
+        self.steps = min(max(step, 0), len(self.trajectory) - 1)
+        self.frame = self.trajectory.frame(self.steps)
+        self.current_time = self.start_time + self.steps / 60
+        self.running = self.steps < len(self.trajectory) - 1
+
+    def step(self):
+        self.seek(self.steps + 1)
+
+    def get_time_string(self):
+        # The replay clock is computed from the tick rather than summed, so it is rounded
+        total_minutes = round(self.current_time * 60)
+        return f"{total_minutes // 60:02d}:{total_minutes % 60:02d}"
+
+    def agent_snapshot(self):
+        frame = self.frame
+        return frame["id"], frame["state"], frame["x"], frame["y"]
+
+    def count_customers_by_state(self, state):
+        return int(np.count_nonzero(self.frame["state"] == STATES.index(state)))
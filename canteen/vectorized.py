@@ -0,0 +1,503 @@
+from collections import Counter, defaultdict, deque
+import numpy as np
+import pandas as pd
+from .layout import resolve_layout, EXIT_LOCATION
+from .queues import CashierQueues, merge_hours, percentile_of_counts
+from .rng import RandomStreams
+from .collector import MODEL_REPORTERS, STATES, MemoryCollector, StreamingCollector, time_string
+from .arrivals import arrival_times_for, arrival_hours
+from .routing import DIRECTIONS, EXIT
+from .profiling import Profiler
+from .kpis import LifecycleKPIs
+from .trajectory import TrajectoryRecorder
+from .congestion import CongestionMaps
+
+# Customer state codes: indices into STATES, then customers who left
+ENTERING, QUEUING, ORDERING, EATING, EXITING, GONE = range(6)
+
+
+class VectorizedCanteenModel:
+    # Same parameters and daily dynamics as CanteenModel, but customers are rows in
+    # struct-of-arrays NumPy columns and every state is advanced as one batch per tick
+    def __init__(self, width=None, height=None, queue_capacity=5, queue_policy="shortest", verbose=False, seed=None,
+                 common_random_numbers=False, collect_to=None, chunk_ticks=240, agent_sample_every=None,
+                 collect_format="npz", record_to=None, arrival_profile=None, arrival_times=None, profile=False, layout=None,
+                 congestion=False):
+        if queue_policy not in ("shortest", "random"):
+            raise ValueError(f"Unknown queue policy: {queue_policy}")
+        self.layout = resolve_layout(layout, width, height)
+        self.width = self.layout.width
+        self.height = self.layout.height
+        self.start_time = 6  # Simulation starts at 6 AM
+        self.end_time = 18  # Simulation ends at 6 PM
+        self.current_time = self.start_time
+        self.steps = 0
+        self.running = True
+        self.verbose = verbose
+        self.streams = RandomStreams(seed)
+        self.common_random_numbers = common_random_numbers
+        self.arrivals_rng = self.streams.generator("arrivals")
+        self.service_rng = self.streams.generator("service")
+        self.dwell_rng = self.streams.generator("dwell")
+        self.seating_rng = self.streams.generator("seating")
+        self.routing_rng = self.streams.generator("routing")
+
+        self.entrances = np.array(self.layout.entrances, dtype=np.int16).reshape(-1, 2)
+        self.queue_capacity = queue_capacity
+        self.queue_policy = queue_policy
+        self.service_mean = 2
+        self.service_sd = 1
+
+        # Queue slots and seats are destinations of the layout's route tables, see canteen.routing
+        routes = self.layout.routes
+        counter_slots = [CashierQueues.queue_slots(self.layout, pos, queue_capacity) for pos in self.layout.cashier_location]
+        self.slot_pos = np.array(counter_slots, dtype=np.int16).reshape(len(counter_slots), queue_capacity, 2)
+        self.slot_target = routes.destinations(self.slot_pos.reshape(-1, 2).tolist()).reshape(len(counter_slots),
+                                                                                              queue_capacity)
+        self.exit_target = EXIT
+
+        self.seat_pos = np.array(list(dict.fromkeys(self.layout.dining_areas)), dtype=np.int16).reshape(-1, 2)
+        self.seat_target = routes.destinations(self.seat_pos.tolist())
+        self.routes = routes.tables  # once every destination is known
+        self.seat_free = np.ones(len(self.seat_pos), dtype=bool)
+
+        n_counters = len(counter_slots)
+        self.head_ticket = np.zeros(n_counters, dtype=np.int64)
+        self.next_ticket = np.zeros(n_counters, dtype=np.int64)
+        self.door = deque()  # customers who arrived while every queue was full
+        self.served = 0
+        self.total_wait = 0
+        self.wait_counts = Counter()
+        self.time_to_service_counts = defaultdict(Counter)
+        self.lifecycle = LifecycleKPIs()
+
+        # Customer columns; rows are appended on arrival and compacted once mostly gone
+        self.size = 0
+        self.gone = 0
+        self.arrived = 0
+        self.columns = {"state": np.int8, "x": np.int16, "y": np.int16, "counter": np.int32,
+                        "ticket": np.int64, "seat": np.int32, "timer": np.int32,
+                        "joined_at": np.int64, "waiting": bool,
+                        "planned_service_time": np.int32, "dwell_time": np.int32, "uid": np.int64,
+                        "arrived_at": np.int64, "queued_at": np.int64, "served_at": np.int64,
+                        "seated_at": np.int64}
+        for name, dtype in self.columns.items():
+            setattr(self, name, np.zeros(64, dtype=dtype))
+
+        self.arrival_times = arrival_times_for(arrival_profile, arrival_times,
+                                               self.streams.generator("arrival_times"), self.start_time, self.end_time)
+        self.arrival_cursor = 0
+        if collect_to is None and agent_sample_every:
+            self.datacollector = MemoryCollector(MODEL_REPORTERS, chunk_ticks=chunk_ticks, agent_every=agent_sample_every)
+        elif collect_to is None:
+            self.datacollector = StateCountCollector()
+        else:
+            self.datacollector = StreamingCollector(collect_to, MODEL_REPORTERS, chunk_ticks=chunk_ticks,
+                                                    agent_every=agent_sample_every, fmt=collect_format)
+
+        # Every customer's position and state per tick, for replaying the day without simulating it
+        self.recorder = TrajectoryRecorder(record_to, chunk_ticks=chunk_ticks) if record_to is not None else None
+
+        # Per-cell occupancy, passes and blocked moves, in hourly windows or every `congestion` ticks
+        self.congestion = None
+        if congestion:
+            self.track_congestion(60 if congestion is True else congestion)
+
+        self.profiler = None
+        if profile:
+            self.instrument()
+
+    def track_congestion(self, window):
+        # Wraps the phases that move customers, like instrument() does, so a model built
+        # without congestion maps runs the plain code paths
+        maps = self.congestion = CongestionMaps(self.width, self.height, window)
+
+        def tracked(name, stuck_blocked=False):
+            method = getattr(self, name)
+
+            def moved(rows, *args):
+                old_x, old_y = self.x[rows], self.y[rows]
+                method(rows, *args)
+                new_x, new_y = self.x[rows], self.y[rows]
+                if stuck_blocked:
+                    stuck = (old_x == new_x) & (old_y == new_y)
+                    maps.block_many(old_x[stuck], old_y[stuck])
+                maps.move(old_x, old_y, new_x, new_y, self.steps)
+
+            setattr(self, name, moved)
+
+        tracked("move")
+        tracked("wander", stuck_blocked=True)
+        add_customers, step_exiting = self.add_customers, self.step_exiting
+
+        def arrived(count):
+            start = self.size
+            add_customers(count)
+            maps.place(self.x[start:self.size], self.y[start:self.size], self.steps)
+
+        def left(rows):
+            step_exiting(rows)
+            out = rows[self.state[rows] == GONE]
+            maps.lift(self.x[out], self.y[out], self.steps)
+
+        self.add_customers, self.step_exiting = arrived, left
+
+    def instrument(self):
+        # Per-phase timers and agents per tick, see canteen.profiling
+        profiler = self.profiler = Profiler()
+        profiler.time(self.datacollector, "collect", "datacollector.collect")
+        profiler.time(self, "step_customers")
+        for phase in ("step_queuing", "step_service", "step_ordering", "step_eating", "step_exiting", "wander", "move",
+                      "join", "add_customers", "compact", "report_time"):
+            profiler.time(self, phase, "print" if phase == "report_time" else phase)
+        profiler.track_agents(self, lambda: self.size - self.gone)
+
+    def get_time_string(self):
+        return time_string(self.current_time)
+
+    def state_counts(self):
+        return np.bincount(self.state[:self.size], minlength=GONE + 1)[:GONE]
+
+    def count_customers_by_state(self, state):
+        return int(self.state_counts()[STATES.index(state)])
+
+    def queue_length(self):
+        return int((self.next_ticket - self.head_ticket).sum())
+
+    def door_length(self):
+        return len(self.door)
+
+    def serving_count(self):
+        # Customers at a counter, waiting for their order
+        return int(np.count_nonzero((self.state[:self.size] == ORDERING) & (self.counter[:self.size] >= 0)))
+
+    def agent_snapshot(self):
+        active = np.flatnonzero(self.state[:self.size] != GONE)
+        return self.uid[active], self.state[active], self.x[active], self.y[active]
+
+    def mean_wait(self):
+        return self.total_wait / self.served if self.served else 0
+
+    def wait_percentile(self, q):
+        return percentile_of_counts(self.wait_counts, q)
+
+    def latency_percentile(self, name, q):
+        return self.lifecycle.quantile(name, q)
+
+    def time_to_service_percentile(self, q, start=None, end=None):
+        return percentile_of_counts(merge_hours(self.time_to_service_counts, arrival_hours(self, start, end)), q)
+
+    def add_customers(self, count):
+        if count <= 0:
+            return
+        self.reserve(count)
+        rows = slice(self.size, self.size + count)
+        self.state[rows] = ENTERING
+        self.uid[rows] = np.arange(self.arrived, self.arrived + count)
+        self.arrived += count
+        entrance = self.entrances[self.arrivals_rng.integers(0, len(self.entrances), count)]
+        self.x[rows], self.y[rows] = entrance[:, 0], entrance[:, 1]
+        self.counter[rows] = -1
+        self.seat[rows] = -1
+        self.timer[rows] = 0
+        self.joined_at[rows] = -1
+        self.arrived_at[rows] = self.steps
+        self.served_at[rows] = -1
+        self.lifecycle.counts["Arrived"] += count
+        self.waiting[rows] = False
+        if self.common_random_numbers:
+            self.planned_service_time[rows] = self.draw_service_times(count)
+            self.dwell_time[rows] = self.draw_dwell_times(count)
+        self.size += count
+
+    def reserve(self, count):
+        if self.size + count > len(self.state):
+            capacity = max(2 * len(self.state), self.size + count)
+            for name in self.columns:
+                column = getattr(self, name)
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+
+    def draw_service_times(self, count):
+        return np.maximum(1, np.rint(self.service_rng.normal(self.service_mean, self.service_sd, count)))
+
+    def draw_dwell_times(self, count):
+        return self.dwell_rng.integers(20, 31, count)  # Eating takes 20 to 30 steps (minutes)
+
+    def compact(self):
+        keep = np.flatnonzero(self.state[:self.size] != GONE)
+        remap = np.full(self.size, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        for name in self.columns:
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.door = deque(int(remap[i]) for i in self.door if remap[i] >= 0)
+        self.size = len(keep)
+        self.gone = 0
+
+    def step(self):
+        self.datacollector.collect(self)
+        if self.recorder is not None:
+            self.recorder.record(self)
+        if self.congestion is not None:
+            self.congestion.advance(self.steps)
+        self.step_customers(int(self.current_time))
+
+        self.current_time += 1 / 60  # Assume one step is one minute
+        self.steps += 1
+        cursor = int(np.searchsorted(self.arrival_times, self.current_time))
+        self.add_customers(cursor - self.arrival_cursor)
+        self.arrival_cursor = cursor
+
+        if self.current_time >= self.end_time:
+            self.running = False
+            if isinstance(self.datacollector, StreamingCollector):
+                self.datacollector.flush()
+            if self.recorder is not None:
+                self.recorder.close(self)
+            if self.congestion is not None:
+                self.congestion.close(self.steps)
+
+        if self.gone > self.size // 2 and self.gone > 1024:
+            self.compact()
+
+        if self.verbose:
+            self.report_time()
+
+    def report_time(self):
+        print(self.get_time_string())
+
+    def step_customers(self, hour):
+        state = self.state[:self.size]
+        entering = np.flatnonzero(state == ENTERING)
+        queuing = np.flatnonzero(state == QUEUING)
+        ordering = np.flatnonzero(state == ORDERING)
+        eating = np.flatnonzero(state == EATING)
+        exiting = np.flatnonzero(state == EXITING)
+
+        if len(entering):
+            queuing = np.concatenate([queuing, self.step_entering(entering, hour)])
+
+        if len(ordering):
+            self.step_service(ordering)
+            self.step_ordering(ordering)
+        if len(queuing):
+            self.step_queuing(queuing)
+        if len(eating):
+            self.step_eating(eating)
+        if len(exiting):
+            self.step_exiting(exiting)
+
+    def step_entering(self, rows, hour):
+        # Turns customers away outside opening hours, else sends new arrivals to a queue or
+        # the door; returns the rows that got a queue and start queuing this tick
+        if hour > 16 or hour < 8:
+            self.turn_away(rows)
+            return rows[:0]
+        joining = rows[(self.counter[rows] < 0) & ~self.waiting[rows]]
+        for i in self.routing_rng.permutation(joining):
+            self.join(int(i))
+        admitted = rows[self.counter[rows] >= 0]
+        self.waiting[admitted] = False
+        self.state[admitted] = QUEUING
+        self.queued_at[admitted] = self.steps
+        return admitted
+
+    def turn_away(self, rows):
+        # Everyone still entering leaves, including the door. A customer handed a slot from
+        # the door holds the last ticket of that counter, since nobody joins between a door
+        # admission and the next tick's arrivals, so giving it back shortens the line.
+        holding = rows[self.counter[rows] >= 0]
+        np.subtract.at(self.next_ticket, self.counter[holding], 1)
+        self.counter[holding] = -1
+        self.waiting[rows] = False
+        self.door.clear()
+        self.state[rows] = EXITING
+
+    def step_exiting(self, rows):
+        self.move(rows, np.full(len(rows), self.exit_target))
+        out = rows[self.layout.cells[self.x[rows], self.y[rows]] == EXIT_LOCATION]
+        self.state[out] = GONE
+        self.gone += len(out)
+        lifecycle = self.lifecycle
+        lifecycle.counts["Left"] += len(out)
+        lifecycle.counts["Left Unserved"] += int(np.count_nonzero(self.served_at[out] < 0))
+        lifecycle.sketches["Time In System"].add_many(self.steps - self.arrived_at[out])
+
+    def join(self, i):
+        lengths = self.next_ticket - self.head_ticket
+        open_counters = np.flatnonzero(lengths < self.queue_capacity)
+        if not len(open_counters):
+            self.waiting[i] = True
+            self.door.append(i)
+            return
+        if self.queue_policy == "random":
+            counter = self.routing_rng.choice(open_counters)
+        else:
+            counter = open_counters[np.argmin(lengths[open_counters])]
+        self.admit(i, counter)
+
+    def admit(self, i, counter):
+        self.counter[i] = counter
+        self.ticket[i] = self.next_ticket[counter]
+        self.next_ticket[counter] += 1
+
+    def move(self, rows, targets):
+        self.x[rows], self.y[rows] = self.routes.step(targets, self.x[rows], self.y[rows])
+
+    def step_queuing(self, rows):
+        counters = self.counter[rows]
+        places = self.ticket[rows] - self.head_ticket[counters]
+        self.move(rows, self.slot_target[counters, places])
+        slots = self.slot_pos[counters, places]
+        arrived = rows[(self.x[rows] == slots[:, 0]) & (self.y[rows] == slots[:, 1])]
+        unset = arrived[self.joined_at[arrived] < 0]
+        self.joined_at[unset] = self.steps
+        heads = arrived[self.ticket[arrived] == self.head_ticket[self.counter[arrived]]]
+        if len(heads):
+            waits = self.steps - self.joined_at[heads]
+            self.served += len(heads)
+            self.total_wait += int(waits.sum())
+            self.wait_counts.update(waits.tolist())
+            for arrived_at in self.arrived_at[heads].tolist():
+                self.time_to_service_counts[arrived_at // 60][self.steps - arrived_at] += 1
+            if self.common_random_numbers:
+                self.timer[heads] = self.planned_service_time[heads]
+            else:
+                self.timer[heads] = self.draw_service_times(len(heads))
+            self.state[heads] = ORDERING
+            self.served_at[heads] = self.steps
+            lifecycle = self.lifecycle
+            lifecycle.counts["Served"] += len(heads)
+            lifecycle.sketches["Time In Queue"].add_many(self.steps - self.queued_at[heads])
+            lifecycle.sketches["Time To Service"].add_many(self.steps - self.arrived_at[heads])
+
+    def step_service(self, rows):
+        served = rows[self.counter[rows] >= 0]
+        self.timer[served] -= 1
+        for i in served[self.timer[served] <= 0]:
+            self.release_counter(i)
+
+    def step_ordering(self, rows):
+        seeking = rows[self.counter[rows] < 0]
+        if not len(seeking):
+            return
+        self.claim_seats(seeking[self.seat[seeking] < 0])
+
+        seated = seeking[self.seat[seeking] >= 0]
+        self.wander(seeking[self.seat[seeking] < 0])
+        if len(seated):
+            seats = self.seat[seated]
+            self.move(seated, self.seat_target[seats])
+            arrived = seated[(self.x[seated] == self.seat_pos[seats, 0]) & (self.y[seated] == self.seat_pos[seats, 1])]
+            self.state[arrived] = EATING
+            self.seated_at[arrived] = self.steps
+            self.lifecycle.counts["Seated"] += len(arrived)
+            self.lifecycle.sketches["Time To Seat"].add_many(self.steps - self.arrived_at[arrived])
+            # Dwell time is drawn once on sitting down; the customer leaves the tick after it ends
+            if self.common_random_numbers:
+                self.timer[arrived] = self.dwell_time[arrived] + 1
+            else:
+                self.timer[arrived] = self.draw_dwell_times(len(arrived)) + 1
+
+    def release_counter(self, i):
+        counter = self.counter[i]
+        self.counter[i] = -1
+        self.free_counter(counter)
+
+    def free_counter(self, counter):
+        self.head_ticket[counter] += 1
+        # Hand the freed slot to the longest-waiting customer still at the door
+        while self.door:
+            waiting = self.door.popleft()
+            if self.state[waiting] == ENTERING and self.counter[waiting] < 0:
+                self.admit(waiting, counter)
+                break
+
+    def claim_seats(self, rows):
+        self.seat[rows] = self.allocate_seats(self.x[rows], self.y[rows])
+
+    def allocate_seats(self, xs, ys):
+        # Seats for customers standing at (xs, ys), in customer order; -1 for those left
+        # without once every seat is taken. Each wants a random free seat or the nearest
+        # one, evenly. Those wanting the nearest choose first, in rounds: a seat wanted by
+        # several goes to the earliest customer and the others choose again. The others
+        # then draw from the seats left.
+        seats = np.full(len(xs), -1, dtype=np.int32)
+        if not len(xs):
+            return seats
+        free = np.flatnonzero(self.seat_free)
+        n = min(len(xs), len(free))
+        if not n:
+            return seats
+        randomly = self.seating_rng.random(n) < 0.5
+        choosing = np.flatnonzero(~randomly)
+        dist = (np.abs(self.seat_pos[free, 0].astype(np.int32) - xs[choosing, None]) +
+                np.abs(self.seat_pos[free, 1].astype(np.int32) - ys[choosing, None]))
+        taken = np.zeros(len(free), dtype=bool)
+        while len(choosing):
+            wanted = np.argmin(dist, axis=1)
+            _, first = np.unique(wanted, return_index=True)  # choosing is in customer order
+            seats[choosing[first]] = free[wanted[first]]
+            taken[wanted[first]] = True
+            again = np.ones(len(choosing), dtype=bool)
+            again[first] = False
+            choosing, dist = choosing[again], dist[again]
+            dist[:, taken] = np.iinfo(np.int32).max
+        drawing = np.flatnonzero(randomly)
+        if len(drawing):
+            seats[drawing] = self.seating_rng.choice(free[~taken], len(drawing), replace=False)
+        self.seat_free[seats[:n]] = False
+        return seats
+
+    def occupied_cells(self):
+        active = np.flatnonzero(self.state[:self.size] != GONE)
+        occupied = np.zeros((self.width, self.height), dtype=bool)
+        occupied[self.x[active], self.y[active]] = True
+        return occupied
+
+    def wander(self, rows):
+        # Random step onto an empty floor cell, as Customer.move does
+        if not len(rows):
+            return
+        occupied = self.occupied_cells()
+        moves = np.array(DIRECTIONS, dtype=np.int16)
+        nx = self.x[rows, None] + moves[None, :, 0]
+        ny = self.y[rows, None] + moves[None, :, 1]
+        inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+        cx, cy = np.clip(nx, 0, self.width - 1), np.clip(ny, 0, self.height - 1)
+        valid = inside & self.layout.floor[cx, cy] & ~occupied[cx, cy]
+        scores = np.where(valid, self.routing_rng.random(valid.shape), -1)
+        choice = np.argmax(scores, axis=1)
+        can_move = valid[np.arange(len(rows)), choice]
+        rows, choice = rows[can_move], choice[can_move]
+        self.x[rows] = nx[can_move, choice]
+        self.y[rows] = ny[can_move, choice]
+
+    def step_eating(self, rows):
+        self.timer[rows] -= 1
+        done = rows[self.timer[rows] <= 0]
+        self.release_seats(self.seat[done])
+        self.seat[done] = -1
+        self.state[done] = EXITING
+        self.lifecycle.sketches["Dwell"].add_many(self.steps - self.seated_at[done])
+
+    def release_seats(self, seats):
+        self.seat_free[seats] = True
+
+
+class StateCountCollector:
+    # Model-level rows matching the CanteenModel DataCollector's model reporters
+    def __init__(self):
+        self.rows = []
+
+    def collect(self, model):
+        self.rows.append((model.current_time, model.get_time_string()) +
+                         tuple(int(n) for n in model.state_counts()) +
+                         (model.queue_length(), model.door_length(), model.mean_wait()))
+
+    def get_model_vars_dataframe(self):
+        return pd.DataFrame(self.rows, columns=["Current Time", "Formatted Time", "Entering", "Queuing", "Ordering",
+                                                "Eating", "Exiting", "Queue Length", "Waiting For Queue",
+                                                "Mean Queue Wait"])
@@ -1,49 +1,116 @@
-from .agents import Customer, StaticElement
-
-def customer_portrayal(agent):
-    if isinstance(agent, Customer):
-        portrayal = {"Shape": "circle",
-                     "Filled": "true",
-                     "r": 0.5}
-        if agent.state == "entering":
-            portrayal["Color"] = "green"
-            portrayal["Layer"] = 1  # Ensure this is higher than StaticElement layer
-        elif agent.state == "queuing":
-            portrayal["Color"] = "yellow"
-            portrayal["Layer"] = 1
-        elif agent.state == "ordering":
-            portrayal["Color"] = "blue"
-            portrayal["Layer"] = 1
-        elif agent.state == "eating":
-            portrayal["Color"] = "red"
-            portrayal["Layer"] = 1
-        elif agent.state == "exiting":
-            portrayal["Color"] = "gray"
-            portrayal["Layer"] = 1
-        return portrayal
-
-    elif isinstance(agent, StaticElement):
-        portrayal = {"Shape": "rect",
-                     "w": 1,
-                     "h": 1,
-                     "Filled": "true",
-                     "Layer": 0}  # Static elements should be in a lower layer
-        if agent.element_type == "boundary":
-            portrayal["Color"] = "black"
-            portrayal["Layer"] = 0
-        elif agent.element_type == "cashier_location":
-            portrayal["Color"] = "lightyellow"
-            portrayal["Layer"] = 0
-        elif agent.element_type == "dining_area":
-            portrayal["Color"] = "lightblue"
-            portrayal["Layer"] = 0
-        elif agent.element_type == "exit_location":
-            portrayal["Color"] = "orange"
-            portrayal["Layer"] = 0
-        elif agent.element_type == "store":
-            portrayal["Color"] = "yellow"
-            portrayal["Layer"] = 0
-        elif agent.element_type == "big_table":
-            portrayal["Color"] = "blue"
-            portrayal["Layer"] = 0
-        return portrayal
\ No newline at end of file
+import json
+from pathlib import Path
+import numpy as np
+from mesa.visualization.ModularVisualization import CHART_JS_FILE, TextElement, VisualizationElement
+from .collector import MODEL_REPORTERS, STATES
+from .congestion import METRICS
+from .kpis import QUANTILES
+from .layout import ELEMENT_TYPES
+
+STATE_COLORS = {"entering": "green", "queuing": "yellow", "ordering": "blue", "eating": "red", "exiting": "gray"}
+HEAT_LEVELS = 16
+STATIC_DIR = Path(__file__).with_name("static")
+
+
+def layout_portrayal(element_type):
+    portrayal = {"Shape": "rect",
+                 "w": 1,
+                 "h": 1,
+                 "Filled": "true",
+                 "Layer": 0}  # Static elements should be in a lower layer
+    if element_type == "boundary":
+        portrayal["Color"] = "black"
+    elif element_type == "cashier_location":
+        portrayal["Color"] = "lightyellow"
+    elif element_type == "dining_area":
+        portrayal["Color"] = "lightblue"
+    elif element_type == "exit_location":
+        portrayal["Color"] = "orange"
+    elif element_type == "store":
+        portrayal["Color"] = "yellow"
+    elif element_type == "big_table":
+        portrayal["Color"] = "blue"
+    return portrayal
+
+
+class DeltaCanvasGrid(VisualizationElement):
+    # Sends the floor plan once per model, then only the customers whose position or
+    # state changed since the last frame, as flat [id, x, y, state, ...] arrays. With a
+    # `heatmap` metric and a model keeping congestion maps, it also shades each cell by its
+    # running total, sending only the cells whose shade changed as [x, y, level, ...]
+    local_includes = ["DeltaCanvasModule.js"]
+    local_dir = str(STATIC_DIR)
+
+    def __init__(self, grid_width, grid_height, canvas_width=500, canvas_height=500, heatmap=None):
+        super().__init__()
+        self.model = None
+        self.shown = {}
+        self.heatmap = heatmap
+        self.heat = None
+        state_colors = [STATE_COLORS[state] for state in STATES]
+        self.js_code = (f"elements.push(new DeltaCanvasModule({canvas_width}, {canvas_height}, {grid_width}, "
+                        f"{grid_height}, {json.dumps(state_colors)}, {HEAT_LEVELS}));")
+
+    def render(self, model):
+        data = {}
+        if model is not self.model:
+            # A new or reset model: the client redraws the floor and forgets every customer
+            self.model, self.shown, self.heat = model, {}, None
+            cells = model.layout.cells
+            xs, ys = np.nonzero(cells)
+            data["floor"] = np.stack([xs, ys, cells[xs, ys]], axis=1).ravel().tolist()
+            data["colors"] = {code: layout_portrayal(name)["Color"] for code, name in ELEMENT_TYPES.items()}
+
+        shown, current, changed = self.shown, {}, []
+        for unique_id, state, x, y in zip(*(np.asarray(column).tolist() for column in model.agent_snapshot())):
+            entry = current[unique_id] = (x, y, state)
+            if shown.get(unique_id) != entry:
+                changed.extend((unique_id, x, y, state))
+        data["changed"] = changed
+        data["gone"] = [unique_id for unique_id in shown if unique_id not in current]
+        self.shown = current
+        if self.heatmap is not None and getattr(model, "congestion", None) is not None:
+            data["heat"] = self.render_heat(model)
+        return data
+
+    def render_heat(self, model):
+        # Levels are relative to the busiest cell so far, so the layer keeps its contrast
+        # as the day fills up
+        now = getattr(model, "schedule", model).steps
+        total = model.congestion.totals(now)[METRICS.index(self.heatmap)]
+        top = total.max()
+        heat = total * (HEAT_LEVELS - 1) // top if top else np.zeros_like(total)
+        previous = self.heat if self.heat is not None else np.zeros_like(heat)
+        xs, ys = np.nonzero(heat != previous)
+        self.heat = heat
+        return np.stack([xs, ys, heat[xs, ys]], axis=1).ravel().tolist()
+
+
+class BatchedChartModule(VisualizationElement):
+    # Sends only the new row of the plotted model reporters; the client appends rows
+    # and redraws at most once per animation frame
+    package_includes = [CHART_JS_FILE]
+    local_includes = ["BatchedChartModule.js"]
+    local_dir = str(STATIC_DIR)
+
+    def __init__(self, series, canvas_width=500, canvas_height=200, reporters=MODEL_REPORTERS):
+        super().__init__()
+        self.labels = [s["Label"] for s in series]
+        self.reporters = reporters
+        series = [{"Label": s["Label"], "Color": s["Color"]} for s in series]
+        self.js_code = f"elements.push(new BatchedChartModule({json.dumps(series)}, {canvas_width}, {canvas_height}));"
+
+    def render(self, model):
+        return [[model.get_time_string()] + [self.reporters[label](model) for label in self.labels]]
+
+
+class LatencyTable(TextElement):
+    # Live lifecycle latencies (minutes) and counters from the model's quantile sketches
+    def render(self, model):
+        lifecycle = model.lifecycle
+        header = "".join(f"<th>P{q}</th>" for q in QUANTILES)
+        rows = "".join(f"<tr><td>{name}</td>" + "".join(f"<td>{sketch.quantile(q)}</td>" for q in QUANTILES) +
+                       "</tr>" for name, sketch in lifecycle.sketches.items())
+        counts = ", ".join(f"{name}: {count}" for name, count in lifecycle.counts.items())
+        return (f"<table class='table table-sm'><tr><th>Minutes</th>{header}</tr>{rows}</table>"
+                f"<small>{counts}</small>")
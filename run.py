@@ -1,4 +1,19 @@
-from canteen.server import run_server
+import sys
+
+
+def main():
+    # Imported here, so importing this file (e.g. in a spawned worker) stays headless
+    from canteen.server import run_live_server, run_replay_server, run_server
+
+    # --live runs the model in the background at full speed instead of one step per browser frame;
+    # --replay DIR plays back a day recorded with record_to instead of simulating one
+    if "--replay" in sys.argv[1:]:
+        run_replay_server(sys.argv[sys.argv.index("--replay") + 1])
+    elif "--live" in sys.argv[1:]:
+        run_live_server()
+    else:
+        run_server()
+
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    main()
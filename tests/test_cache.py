@@ -0,0 +1,46 @@
+import pandas as pd
+from canteen.batch import run_replications
+from canteen.cache import ResultsCache
+
+
+def frame(value):
+    result = pd.DataFrame({"Queuing": [value] * 50})
+    result.attrs["kpis"] = {"Served": value}
+    return result
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultsCache(tmp_path, max_entries=3)
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put(key, frame(1))
+    assert cache.get("aa1") is not None
+    cache.put("dd4", frame(2))
+    assert cache.get("bb2") is None
+    assert [cache.get(key).attrs["kpis"]["Served"] for key in ("aa1", "cc3", "dd4")] == [1, 1, 2]
+
+
+def test_writes_do_not_rescan_the_directory(tmp_path, monkeypatch):
+    cache = ResultsCache(tmp_path, max_bytes=10_000)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or entries())
+    for i in range(40):
+        cache.put(f"{i:04d}", frame(i))
+    assert len(scans) == 1
+    assert cache.size() == cache.total == sum(cache.index.values()) <= 10_000
+    assert len(cache.index) == len(list(tmp_path.glob("*/*.npz"))) < 40
+
+
+def test_an_existing_cache_is_counted_on_the_first_write(tmp_path):
+    ResultsCache(tmp_path).put("aa1", frame(1))
+    ResultsCache(tmp_path).put("bb2", frame(2))
+    cache = ResultsCache(tmp_path, max_entries=2)
+    cache.put("cc3", frame(3))
+    assert cache.get("aa1") is None and cache.get("cc3") is not None
+
+
+def test_profiled_runs_bypass_the_cache(tmp_path):
+    params = dict(engine="vectorized", processes=1, cache=tmp_path, arrival_profile={8: 30, 9: 0})
+    assert run_replications(1, **params).attrs["cache_hits"] == 0
+    assert run_replications(1, **params).attrs["cache_hits"] == 1
+    assert "cache_hits" not in run_replications(1, profile=True, **params).attrs
@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+from canteen.model import CanteenModel
+from canteen.vectorized import VectorizedCanteenModel
+
+
+def run(cls, **params):
+    model = cls(seed=1, agent_sample_every=30, **params)
+    while model.running:
+        model.step()
+    return model.datacollector
+
+
+@pytest.mark.parametrize("cls", [CanteenModel, VectorizedCanteenModel])
+def test_sampled_agents_are_kept_without_collect_to(cls, tmp_path):
+    in_memory = run(cls)
+    on_disk = run(cls, collect_to=tmp_path)
+    agents = in_memory.get_agent_vars_dataframe()
+    assert len(agents) and set(agents["Step"]) <= set(range(0, 720, 30))
+    pd.testing.assert_frame_equal(agents, on_disk.get_agent_vars_dataframe())
+    pd.testing.assert_frame_equal(in_memory.get_model_vars_dataframe(), on_disk.get_model_vars_dataframe())
@@ -0,0 +1,18 @@
+import pytest
+from canteen.multiday import MultiDayModel
+
+
+@pytest.mark.parametrize("params", [{"arrival_profile": {8: 60}}, {"arrival_times": [8.5, 9.0]},
+                                    {"record_to": "day"}, {"congestion": True}])
+def test_single_day_options_are_rejected(params):
+    with pytest.raises(ValueError):
+        MultiDayModel(days=2, **params)
+
+
+def test_days_follow_their_weekday_profiles():
+    model = MultiDayModel(days=2, weekday_profiles={"Monday": {8: 60, 9: 0}})
+    while model.running:
+        model.step()
+    monday, tuesday = model.datacollector.get_model_vars_dataframe().to_dict("records")
+    assert monday["Weekday"] == "Monday" and monday["Arrived"] > 0
+    assert tuesday["Weekday"] == "Tuesday" and tuesday["Arrived"] == 0
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from canteen.parallel import ParallelCanteenModel
+from canteen.vectorized import VectorizedCanteenModel
+
+
+def snapshot(model):
+    uid, state, x, y = model.agent_snapshot()
+    order = np.argsort(uid)
+    return uid[order], state[order], x[order], y[order]
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_day_matches_vectorized(workers):
+    # With common random numbers and enough seats, every customer is in the same state
+    # on the same cell at every tick
+    vectorized = VectorizedCanteenModel(seed=5, common_random_numbers=True)
+    parallel = ParallelCanteenModel(seed=5, common_random_numbers=True, workers=workers)
+    while vectorized.running:
+        vectorized.step()
+        parallel.step()
+        for expected, actual in zip(snapshot(vectorized), snapshot(parallel)):
+            np.testing.assert_array_equal(actual, expected, err_msg=f"tick {vectorized.steps}")
+    assert not parallel.running
+    assert vectorized.datacollector.get_model_vars_dataframe().equals(parallel.datacollector.get_model_vars_dataframe())
+    for name in ("Time To Service", "Time In System"):
+        assert parallel.latency_percentile(name, 95) == vectorized.latency_percentile(name, 95)
@@ -0,0 +1,152 @@
+import random
+import numpy as np
+import pytest
+from canteen.arrivals import ArrivalProfile, DEFAULT_PROFILE
+from canteen.layout import layout_from_cells, parse_ascii
+from canteen.model import CanteenModel
+from canteen.queues import CashierQueues
+from canteen.vectorized import VectorizedCanteenModel, GONE
+
+# Two counters; the line below the left one runs into a seat after one cell
+FLOOR = """
+#####
+#SS.#
+#CC.#
+#...#
+#o..#
+#####
+"""
+
+
+class Customer:
+    def __init__(self):
+        self.state = "entering"
+        self.counter = None
+        self.waiting = False
+        self.arrived_at = None
+        self.planned_service_time = None
+
+
+def make_queues(capacity=2, policy="shortest", wake=None):
+    layout = layout_from_cells(*parse_ascii(FLOOR))
+    return CashierQueues(layout, capacity=capacity, policy=policy, choice_rng=random.Random(0), wake=wake)
+
+
+def join(queues, customer):
+    # As Customer.enter_canteen does
+    customer.waiting = queues.join(customer) is None
+    return customer
+
+
+def test_queue_slots_stop_before_seats_and_walls():
+    queues = make_queues(capacity=4)
+    assert queues.counters[0].slots == [(1, 3), (1, 2), (1, 2), (1, 2)]
+    assert queues.counters[1].slots == [(2, 3), (2, 2), (2, 1), (2, 1)]
+
+
+def test_default_floor_queue_slots_are_plain_floor():
+    model = CanteenModel(seed=0)
+    for counter in model.queues.counters:
+        assert all(model.layout.is_floor(slot) for slot in counter.slots)
+
+
+@pytest.mark.parametrize("policy", ["shortest", "random"])
+def test_join_fills_every_slot_then_waits_at_the_door(policy):
+    queues = make_queues(policy=policy)
+    customers = [join(queues, Customer()) for _ in range(5)]
+    assert sorted(queues.lengths()) == [2, 2]
+    assert [c.waiting for c in customers] == [False] * 4 + [True]
+    assert list(queues.waiting) == customers[4:]
+    assert not queues.open
+
+
+@pytest.mark.parametrize("policy", ["shortest", "random"])
+def test_leave_reopens_the_counter(policy):
+    queues = make_queues(policy=policy)
+    customers = [join(queues, Customer()) for _ in range(4)]
+    head = queues.counters[1].customers[0]
+    queues.leave(head)
+    assert head.counter is None
+    assert queues.lengths()[1] == 1
+    assert queues.open == [1]
+    assert queues.is_head(queues.counters[1].customers[0])
+    assert join(queues, Customer()).counter == 1
+    assert len(queues) == len(customers)
+
+
+def test_shortest_policy_spreads_customers():
+    queues = make_queues()
+    first, second = join(queues, Customer()), join(queues, Customer())
+    assert {first.counter, second.counter} == {0, 1}
+
+
+def test_door_customer_is_handed_the_freed_slot_and_woken():
+    woken = []
+    queues = make_queues(wake=woken.append)
+    for _ in range(4):
+        join(queues, Customer())
+    door = [join(queues, Customer()) for _ in range(2)]
+    head = queues.counters[0].customers[0]
+    queues.leave(head)
+    assert door[0].counter == 0
+    assert woken == [door[0]]
+    assert list(queues.waiting) == door[1:]
+    assert queues.slot_of(door[0]) == queues.counters[0].slots[1]
+
+
+def test_door_hand_off_skips_customers_who_left():
+    woken = []
+    queues = make_queues(wake=woken.append)
+    for _ in range(4):
+        join(queues, Customer())
+    gone, waiting = join(queues, Customer()), join(queues, Customer())
+    gone.state = "exiting"
+    queues.leave(queues.counters[1].customers[0])
+    assert gone.counter is None
+    assert waiting.counter == 1
+    assert woken == [waiting]
+
+
+def test_turn_away_gives_back_a_slot_handed_over_from_the_door():
+    queues = make_queues()
+    for _ in range(4):
+        join(queues, Customer())
+    admitted = join(queues, Customer())
+    queues.leave(queues.counters[0].customers[0])
+    assert admitted.counter == 0
+    queues.turn_away(admitted)
+    assert admitted.counter is None
+    assert not admitted.waiting
+    assert queues.lengths() == [1, 2]
+    assert queues.open == [0]
+
+
+def test_turn_away_leaves_the_door_line():
+    queues = make_queues()
+    for _ in range(4):
+        join(queues, Customer())
+    first, second = join(queues, Customer()), join(queues, Customer())
+    queues.turn_away(first)
+    assert not first.waiting
+    assert list(queues.waiting) == [second]
+    queues.leave(queues.counters[0].customers[0])
+    assert first.counter is None
+    assert second.counter == 0
+
+
+def test_nobody_holds_a_counter_after_closing():
+    # Under heavy load the door is still full at closing time; everyone there is turned
+    # away without keeping a slot
+    load = ArrivalProfile(DEFAULT_PROFILE).scaled(10)
+    model = CanteenModel(seed=2, arrival_profile=load)
+    while model.running:
+        model.step()
+    assert not model.queues.waiting
+    assert not any(c.state == "exiting" for counter in model.queues.counters for c in counter.customers)
+
+    vectorized = VectorizedCanteenModel(seed=2, arrival_profile=load)
+    while vectorized.running:
+        vectorized.step()
+    state = vectorized.state[:vectorized.size]
+    assert not vectorized.door
+    assert not np.any((state == GONE) & (vectorized.counter[:vectorized.size] >= 0))
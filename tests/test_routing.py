@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from canteen.layout import load_layout, subset_layout
+from canteen.routing import EXIT, QUEUE_LENGTH, compile_routes, distance_field
+from canteen.vectorized import VectorizedCanteenModel
+
+
+@pytest.fixture(scope="module")
+def layout():
+    return load_layout()
+
+
+def sample(layout, tables, count, seed=0):
+    rng = np.random.default_rng(seed)
+    xs, ys = np.nonzero(layout.walkable)
+    picks = rng.integers(0, len(xs), count)
+    destinations = rng.integers(0, tables.compiled + tables.added_count, count)
+    return destinations.astype(np.int32), xs[picks].astype(np.int16), ys[picks].astype(np.int16)
+
+
+def scalar_steps(tables, destinations, xs, ys):
+    return np.array([tables.hop(int(d), int(x), int(y)) for d, x, y in zip(destinations, xs, ys)]).reshape(-1, 2)
+
+
+def test_hop_and_step_agree(layout):
+    tables = compile_routes(layout)
+    destinations, xs, ys = sample(layout, tables, 3000)
+    nx, ny = tables.step(destinations, xs, ys)
+    np.testing.assert_array_equal(np.stack([nx, ny], axis=1), scalar_steps(tables, destinations, xs, ys))
+
+
+def test_every_destination_is_reached(layout):
+    tables = compile_routes(layout)
+    rng = np.random.default_rng(1)
+    xs, ys = np.nonzero(layout.walkable)
+    for destination in rng.choice(np.arange(1, tables.compiled), 20, replace=False):
+        target = tuple(tables.cells[destination].tolist())
+        dist = distance_field(layout.walkable, [target])
+        starts = rng.integers(0, len(xs), 50)
+        pos = np.stack([xs[starts], ys[starts]], axis=1).astype(np.int16)
+        for _ in range(dist[xs[starts], ys[starts]].max() + 12):
+            pos = np.stack(tables.step(np.full(len(pos), destination), pos[:, 0], pos[:, 1]), axis=1)
+        assert (pos == target).all()
+
+
+def test_exit_route_ends_on_an_exit(layout):
+    tables = compile_routes(layout)
+    x, y = 5, 5
+    for _ in range(layout.width * layout.height):
+        x, y = tables.hop(EXIT, x, y)
+    assert (x, y) in layout.exit_location
+
+
+def test_added_destinations_agree_and_stay_with_their_tables(layout):
+    tables = compile_routes(layout)
+    copy = tables.copy()
+    early = copy.strip(10, 30)
+    # Slots of queues longer than QUEUE_LENGTH are added on first use
+    model = VectorizedCanteenModel(layout=subset_layout(layout), queue_capacity=QUEUE_LENGTH + 5)
+    extra = [tuple(cell) for cell in model.slot_pos[:, QUEUE_LENGTH:].reshape(-1, 2).tolist()]
+    extra = [cell for cell in dict.fromkeys(extra) if cell not in copy.index][:12]
+    assert extra
+    added = [copy.destination(layout.walkable, cell) for cell in extra]
+    assert added == list(range(tables.compiled, tables.compiled + len(extra)))
+    assert tables.added_count == early.added_count == 0
+    assert all(cell not in tables.index for cell in extra)
+
+    destinations, xs, ys = sample(layout, copy, 3000, seed=2)
+    nx, ny = copy.step(destinations, xs, ys)
+    np.testing.assert_array_equal(np.stack([nx, ny], axis=1), scalar_steps(copy, destinations, xs, ys))
+
+    # A strip taken afterwards routes like the whole floor within its columns
+    strip = copy.strip(10, 30)
+    inside = (xs >= 10) & (xs < 30)
+    sx, sy = strip.step(destinations[inside], xs[inside], ys[inside])
+    np.testing.assert_array_equal(sx, nx[inside])
+    np.testing.assert_array_equal(sy, ny[inside])
+    strip.destination(layout.walkable, (1, 1))
+    assert (1, 1) not in copy.index
+    assert strip.hops.shape[1] == 20
+
+
+def test_subset_layout_does_not_add_to_its_parent(layout):
+    subset = subset_layout(layout, cashiers=4, seats=20)
+    parent = layout.routes.compiled()
+    known = len(parent.index)
+    VectorizedCanteenModel(layout=subset, queue_capacity=QUEUE_LENGTH + 5)
+    assert subset.routes.tables.added_count > 0
+    assert len(parent.index) == known
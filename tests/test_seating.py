@@ -0,0 +1,71 @@
+import random
+import pytest
+from canteen.layout import load_layout
+from canteen.seating import SeatIndex
+
+
+def brute_nearest(free, pos):
+    return min(free, key=lambda seat: (abs(seat[0] - pos[0]) + abs(seat[1] - pos[1]), seat))
+
+
+@pytest.mark.parametrize("bucket_size", [1, 4, 7])
+def test_nearest_free_matches_a_full_scan(bucket_size):
+    rng = random.Random(bucket_size)
+    seats = sorted({(rng.randrange(60), rng.randrange(40)) for _ in range(300)})
+    index = SeatIndex(seats, bucket_size=bucket_size)
+    free = set(seats)
+    for seat in rng.sample(seats, 250):
+        index.occupy(seat)
+        free.discard(seat)
+        pos = (rng.randrange(-5, 70), rng.randrange(-5, 50))
+        assert index.nearest_free(pos) == brute_nearest(free, pos)
+    for seat in rng.sample(seats, 100):
+        index.release(seat)
+        free.add(seat)
+        pos = (rng.randrange(60), rng.randrange(40))
+        assert index.nearest_free(pos) == brute_nearest(free, pos)
+
+
+def test_nearest_free_breaks_ties_by_seat():
+    index = SeatIndex([(5, 0), (0, 5), (3, 2)])
+    assert index.nearest_free((0, 0)) == (0, 5)
+
+
+def test_default_floor_nearest_free():
+    seats = list(dict.fromkeys(load_layout().dining_areas))
+    index = SeatIndex(seats)
+    for seat in seats[::2]:
+        index.occupy(seat)
+    free = seats[1::2]
+    for pos in [(0, 0), (20, 10), (43, 47), seats[0]]:
+        assert index.nearest_free(pos) == brute_nearest(free, pos)
+
+
+def test_any_free_only_returns_free_seats():
+    seats = [(x, y) for x in range(4) for y in range(4)]
+    index = SeatIndex(seats)
+    for seat in seats[:-3]:
+        index.occupy(seat)
+    rng = random.Random(0)
+    assert {index.any_free(rng) for _ in range(100)} == set(seats[-3:])
+
+
+def test_full_index_has_no_free_seat():
+    seats = [(1, 1), (2, 1)]
+    index = SeatIndex(seats)
+    for seat in seats:
+        index.occupy(seat)
+    assert len(index) == 0
+    assert index.any_free() is None
+    assert index.nearest_free((0, 0)) is None
+
+
+def test_occupy_and_release_are_idempotent():
+    index = SeatIndex([(1, 1), (2, 1)])
+    index.occupy((1, 1))
+    index.occupy((1, 1))
+    assert len(index) == 1 and not index.is_free((1, 1))
+    index.release((1, 1))
+    index.release((1, 1))
+    index.release((9, 9))  # not a seat
+    assert len(index) == 2 and index.is_free((1, 1)) and not index.is_free((9, 9))
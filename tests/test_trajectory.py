@@ -0,0 +1,30 @@
+import json
+import pytest
+from canteen.collector import STATES
+from canteen.model import CanteenModel
+from canteen.trajectory import ReplayModel, Trajectory
+from canteen.vectorized import VectorizedCanteenModel
+
+
+@pytest.mark.parametrize("cls", [CanteenModel, VectorizedCanteenModel])
+def test_replay_decodes_the_recorded_states(cls, tmp_path):
+    model = cls(seed=4, record_to=tmp_path)
+    counts = []
+    while model.running:
+        counts.append([model.count_customers_by_state(state) for state in STATES])
+        model.step()
+    replay = ReplayModel(Trajectory(tmp_path))
+    for step in range(0, len(counts), 37):
+        replay.seek(step)
+        assert [replay.count_customers_by_state(state) for state in STATES] == counts[step]
+
+
+def test_replay_rejects_other_state_codes(tmp_path):
+    model = VectorizedCanteenModel(seed=4, record_to=tmp_path)
+    while model.running:
+        model.step()
+    meta = json.loads((tmp_path / "meta.json").read_text())
+    meta["states"] = meta["states"][::-1]
+    (tmp_path / "meta.json").write_text(json.dumps(meta))
+    with pytest.raises(ValueError):
+        Trajectory(tmp_path)